@@ -1,5 +1,8 @@
+import asyncio
 from power_outages_api.utils import create_db, main
 from power_outages_api.routes import router
+from power_outages_api.events import listen
+from power_outages_api.profiling import ProfilingMiddleware
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 
@@ -7,11 +10,16 @@ from contextlib import asynccontextmanager
 async def lifespan(app: FastAPI):
     print('Booting up application\n', '-' * 20)
     create_db()
+    # relays new data versions from any worker to the clients connected to /outages/stream
+    listener = asyncio.create_task(listen())
     await main(retry=False)
     print("Scraping process finished.")
     
     yield
+    listener.cancel()
     print('-' * 20, 'Shutting down\n')
     
 app = FastAPI(lifespan=lifespan)
-app.include_router(router)
\ No newline at end of file
+app.include_router(router)
+# opt-in Server-Timing breakdown of each request, see power_outages_api/profiling.py
+app.add_middleware(ProfilingMiddleware)
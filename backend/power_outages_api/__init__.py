@@ -2,4 +2,5 @@ from .edeeste import Edeeste, ModelError
 from .edesur import Edesur
 from .edenorte import Edenorte
 from .models import MaintenanceEvent, TimeSectors, MaintenanceEventBase
+from .records import OutageRecord, TimeSlot
 from .db import engine
\ No newline at end of file
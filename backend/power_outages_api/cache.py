@@ -0,0 +1,71 @@
+import threading
+from collections import OrderedDict
+
+class ResultCache:
+    '''
+    LRU cache of rendered response bodies, bounded by their total size in bytes.
+    Every entry belongs to a single data version, so the whole cache is dropped as soon as a newer version is seen
+    '''
+    def __init__(self, max_bytes: int, entry_overhead: int = 0):
+        '''
+        max_bytes: the total size the cached values may take
+        entry_overhead (optional): the size charged for every entry on top of its value, so empty values are bounded too
+        '''
+        self.max_bytes = max_bytes
+        self.entry_overhead = entry_overhead
+        self.version = None
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _invalidate(self, version: int) -> bool:
+        '''
+        Drops every entry if the version is newer than the cached one
+        Returns whether the version matches the cached entries
+        '''
+        if self.version is None or version > self.version:
+            self._entries.clear()
+            self.size = 0
+            self.version = version
+        
+        return version == self.version
+
+    def get(self, key, version):
+        '''
+        key: a hashable, normalized representation of the request
+        version: the current data version
+        Returns the cached value, or None if it is missing or was rendered from an older version
+        '''
+        with self._lock:
+            if not self._invalidate(version):
+                return None
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+
+            return value
+
+    def set(self, key, version, value: bytes) -> None:
+        '''
+        key: a hashable, normalized representation of the request
+        version: the data version the value was rendered from
+        value: the rendered body
+        Stores the value and evicts the least recently used entries until the cache fits within max_bytes
+        '''
+        cost = len(value) + self.entry_overhead
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            # a request that read an older version must not overwrite fresher data
+            if not self._invalidate(version):
+                return
+            if key in self._entries:
+                self.size -= len(self._entries.pop(key)) + self.entry_overhead
+            self._entries[key] = value
+            self.size += cost
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last = False)
+                self.size -= len(evicted) + self.entry_overhead
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,133 @@
+import math
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+# lookup tables for Spanish dates. they replace strftime/strptime with the es_ES locale,
+# which changes process-wide state and is not safe to use from the scraper threads
+WEEKDAYS = ('lunes', 'martes', 'miércoles', 'jueves', 'viernes', 'sábado', 'domingo')
+MONTHS = ('enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
+          'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre')
+
+# an Excel date serial number represents n days from 1899-12-30
+EXCEL_EPOCH = date(1899, 12, 30)
+# serial numbers between 1954 and 2173. anything else is not a date we would expect in a schedule
+EXCEL_SERIALS = range(20_000, 100_000)
+
+# folds accents and punctuation so that 'Miércoles, 5 de Noviembre.' and 'miercoles 5 de noviembre' read the same
+_FOLD = str.maketrans('áéíóúüñÁÉÍÓÚÜÑ,.', 'aeiouunAEIOUUN  ')
+
+def _fold(text: str) -> str:
+    return text.translate(_FOLD).lower()
+
+_WEEKDAY_LOOKUP = {_fold(name): i for i, name in enumerate(WEEKDAYS)}
+_WEEKDAY_LOOKUP.update({name[:3]: i for name, i in list(_WEEKDAY_LOOKUP.items())})
+_MONTH_LOOKUP = {_fold(name): i + 1 for i, name in enumerate(MONTHS)}
+_MONTH_LOOKUP.update({name[:3]: i for name, i in list(_MONTH_LOOKUP.items())})
+_MONTH_LOOKUP.update({'setiembre': 9, 'sept': 9, 'set': 9})
+
+_FILLERS = frozenset(('de', 'del'))
+# two candidate years are a tie when their distances to the reference differ by less than a week
+YEAR_TIE = timedelta(days = 7)
+
+def format_spanish_date(day: date) -> str:
+    '''
+    day: a date object
+    Returns the date in the following format: 'lunes 03 de noviembre'
+    '''
+    return f'{WEEKDAYS[day.weekday()]} {day.day:02d} de {MONTHS[day.month - 1]}'
+
+def _infer_year(day: int, month: int, weekday: int | None, reference: date) -> date | None:
+    '''
+    Picks the year that puts the date closest to the reference date, so that a schedule published
+    in late December can refer to early January and vice versa. The weekday, which the model sometimes
+    gets wrong, only breaks ties between two candidates that are about as close to the reference
+    '''
+    candidates = []
+    for year in (reference.year - 1, reference.year, reference.year + 1):
+        try:
+            candidates.append(date(year, month, day))
+        except ValueError:
+            continue
+    if not candidates:
+        return None
+
+    candidates.sort(key = lambda d: abs(d - reference))
+    if weekday is not None and len(candidates) > 1 and abs(candidates[1] - reference) - abs(candidates[0] - reference) <= YEAR_TIE:
+        return next((d for d in candidates[:2] if d.weekday() == weekday), candidates[0])
+
+    return candidates[0]
+
+# a weekly schedule repeats the same handful of dates on every row, so most lookups are cache hits
+@lru_cache(maxsize = 1024)
+def _parse_text(text: str, reference: date) -> date | None:
+    '''
+    Reads the weekday, day, month, and year from the words of the date, in that order
+    '''
+    weekday = day = month = year = None
+    for word in _fold(text).split():
+        if word in _FILLERS:
+            continue
+        if word.isdigit():
+            if day is None and len(word) <= 2:
+                day = int(word)
+            elif month and len(word) == 4:
+                year = int(word)
+                break
+            else:
+                return None
+        elif day is None:
+            weekday = _WEEKDAY_LOOKUP.get(word)
+        elif month is None:
+            month = _MONTH_LOOKUP.get(word)
+            if month is None:
+                return None
+    if day is None or month is None:
+        return None
+
+    if year:
+        try:
+            return date(year, month, day)
+        except ValueError:
+            return None
+
+    return _infer_year(day, month, weekday, reference)
+
+def _parse_value(value, reference: date | None) -> date | None:
+    if isinstance(value, str):
+        text = value.strip()
+        if text.isdigit():
+            return _parse_value(int(text), reference)
+        if len(text) >= 10 and text[4] == '-':
+            try:
+                return date.fromisoformat(text[:10])
+            except ValueError:
+                return None
+        return _parse_text(text, reference or date.today())
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # NaN and infinity come from empty or broken spreadsheet cells
+        if isinstance(value, float) and not math.isfinite(value):
+            return None
+        if int(value) not in EXCEL_SERIALS:
+            return None
+        return EXCEL_EPOCH + timedelta(days = int(value))
+    
+    # numpy and pandas scalars
+    return _parse_value(value.item(), reference) if hasattr(value, 'item') else None
+
+def parse_spanish_date(value, reference: date = None) -> date | None:
+    '''
+    value: a date in any of the formats used by the providers: 'lunes 03 de noviembre', 'Miércoles 5 de noviembre, 2025',
+    an ISO string, an Excel serial number, or a date object
+    reference (optional): the date used to infer a missing year. Defaults to today
+    Returns a date object, or None if the value could not be parsed
+    '''
+    parsed = _parse_value(value, reference)
+    # the scrapers store these events as 'Date not available.', so the raw value is only visible here
+    if parsed is None and value is not None:
+        print(f'Could not parse the date {value!r}.')
+    
+    return parsed
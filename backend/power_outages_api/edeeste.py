@@ -1,13 +1,13 @@
-import locale, requests, os, io, pandas as pd
-from datetime import date, timedelta, datetime
-from google import genai
-from pdf2image import convert_from_path
+import io, pandas as pd, pypdfium2 as pdfium
+from datetime import date, timedelta
+from PIL import Image, ImageOps
 from .electric_providers import ElectricProvider
+from .records import OutageRecord, TimeSlot
+from .dates import format_spanish_date, parse_spanish_date
 from dotenv import load_dotenv, find_dotenv
 
 path = find_dotenv()
 load_dotenv(path)
-locale.setlocale(locale.LC_TIME, 'es_ES.UTF-8')
 
 class ModelError(Exception):
     pass
@@ -16,6 +16,18 @@ class ScrapeError(Exception):
     pass
 
 class Edeeste(ElectricProvider):
+    # the pdf is only rendered and sent to Gemini when the link of the current week changes, so checking often is cheap,
+    # and the schedule of the next week, which is usually posted on Friday, is picked up on Monday
+    publication_windows = (((4, 5, 6, 0), 6, 22),)
+    timeout = 900
+    # every full refresh is a model call, so they never overlap, even across workers
+    max_concurrency = 1
+    # a new schedule is published once a week and is sometimes a day late, so a week without a successful refresh is normal
+    freshness_sla = timedelta(days = 8)
+    retryable_errors = (ModelError,)
+    # Gemini bills images in 768px tiles, so pages are capped at two tiles per side
+    render_dpi = 150
+    max_page_side = 1536
     url = 'https://edeeste.com.do/index.php/programa-de-mantenimiento/'
     headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
     def __init__(self):
@@ -40,18 +52,17 @@ class Edeeste(ElectricProvider):
         """
         # changes the language of the datetime objects to Spansh
         today = date.today()
-        monday = (today - timedelta(days = today.weekday())).strftime('%A %d de %B')
+        monday = format_spanish_date(today - timedelta(days = today.weekday()))
         
         return monday
     
-    def _get_download_link(self, monday: str = None) -> str:
+    @staticmethod
+    def _find_download_link(soup, monday: str) -> str:
         """
-        Searches the website for the download link for the maintenance schedule of the current week
-        Returns the link as a strng
+        Searches the listing page for the download link of the maintenance schedule of the week that starts on monday
+        Returns the link as a string
         """
-        if not monday:
-            monday = self._get_monday()
-        parent_tag = self.soup.find_all('div', class_ = 'media')
+        parent_tag = soup.find_all('div', class_ = 'media')
         if not parent_tag:
             raise ScrapeError('Error fetching data. Website structure may have changed.')
         
@@ -61,27 +72,63 @@ class Edeeste(ElectricProvider):
                 target_tag = child.find(lambda tag: tag.name == 'a' and tag.text.lower() == 'descargar')
                 try:
                     download_link = target_tag['data-downloadurl']
-                except KeyError:
-                    raise Exception('Error fetching data. Website structure may have changed.')
+                except (KeyError, TypeError):
+                    raise ScrapeError('Error fetching data. Website structure may have changed.')
                 return download_link
         
         # if the loop finishes without returning, we could not find the data we were looking for
         raise ScrapeError('Error fetching data. Website structure may have changed, or the data for the current week may not be available yet.')
+    
+    def _get_download_link(self, monday: str = None) -> str:
+        """
+        Searches the website for the download link for the maintenance schedule of the current week
+        Returns the link as a strng
+        """
+        return self._find_download_link(self.soup, monday if monday else self._get_monday())
+    
+    @classmethod
+    def document_link(cls, soup) -> str | None:
+        try:
+            return cls._find_download_link(soup, cls._get_monday())
+        except ScrapeError:
+            return None
                  
-    def _download_file(self, monday: str = None) -> str:
+    def _download_file(self, monday: str = None) -> io.BytesIO:
         """
-        Downloads the file and saves it to the current directory
-        returns the name of the saved file
+        Downloads the file into memory
+        Returns a buffer with the contents of the pdf file
         """
-        file_content = requests.get(self._get_download_link(monday=monday if monday else None), headers = Edeeste.headers)
-        file_name = 'temp.pdf'
-        if not os.path.exists(file_name):
-            with open(file_name, 'wb') as pdf:
-                pdf.write(file_content.content)
-                
-        return file_name
+        return self.download(self._get_download_link(monday=monday if monday else None), headers = Edeeste.headers)
+    
+    @classmethod
+    def _render_pages(cls, pdf_file: io.BytesIO) -> list:
+        """
+        Renders each page of the pdf file straight from memory, in grayscale
+        Returns a list of PIL images ready to be sent to the model
+        """
+        pdf = pdfium.PdfDocument(pdf_file)
+        try:
+            return [cls._shape_page(page.render(scale = cls.render_dpi / 72, grayscale = True).to_pil()) for page in pdf]
+        finally:
+            pdf.close()
+    
+    @classmethod
+    def _shape_page(cls, image: Image.Image) -> Image.Image:
+        """
+        Crops the blank margins of the page and downscales it so that its longest side fits within max_page_side
+        Returns the smaller grayscale image
+        """
+        image = image.convert('L')
+        # getbbox finds the non-zero region, so we invert the page to treat white as empty
+        bbox = ImageOps.invert(image).point(lambda p: 255 if p > 16 else 0).getbbox()
+        if bbox:
+            image = image.crop(bbox)
+        if max(image.size) > cls.max_page_side:
+            image.thumbnail((cls.max_page_side, cls.max_page_side), Image.LANCZOS)
+        
+        return image
                 
-    def _extract_from_pdf(self, path: str = None) -> str:
+    def _extract_from_pdf(self, file: io.BytesIO = None) -> str:
         """
         Extracts the data from the downloaded pdf file and creates a csv file from the extracted data
         Returns a string representaton of the exctracted data
@@ -104,54 +151,37 @@ class Edeeste(ElectricProvider):
                     Analyze the entire image and extract all the entries in order from start to end of week. Your response should not contain any text outside of the csv data. Each row should have exactly four columns.
                     
                     ''']
-        pdf_file = path if path else self._download_file()
+        pdf_file = file if file else self._download_file()
         # turns each page of the pdf file into an image obect
-        images = convert_from_path(pdf_file, dpi = 200)
-        
-        # the pdf file will no longer be used
-        if os.path.exists(pdf_file):
-            os.remove(pdf_file)
+        images = self._render_pages(pdf_file)
         
         for image in images:
             prompt.append(image)
             
-        client = genai.Client(api_key = os.getenv('GEMINI_API_KEY'))
         try:
-            response = client.models.generate_content(
-                model = 'gemini-2.5-pro',
-                contents = prompt
-            )
+            response = self._generate(prompt)
         except Exception:
             raise ModelError('AI model not currently available. Please try again later or use a different model.')
         
         return response.text
     
     def _organize_data(self, data: str = None) -> list:
+        """
+        Groups the extracted rows by day and province
+        Returns a list of OutageRecord objects
+        """
         # takes a string representation of the csv text and treats it as an actual csv file
         csv_file = io.StringIO(data if data else self._extract_from_pdf())
         df = pd.read_csv(csv_file)
+        week_number = date.today().isocalendar()[1]
         
         data = []
         
-        for day in df.day.unique():
-            for province in df.province.unique():
-                filtered_data = df[(df.day == day) & (df.province == province)]
-                if filtered_data.empty:
-                    continue
-                maintenance = []
-                for _, row in filtered_data.iterrows():
-                    maintenance.append({'time': row.time, 'sectors': row.sectors.split(',')})
-                try:
-                    formatted_date = str(datetime.strptime(day + f', {date.today().year}', '%A %d de %B, %Y').date())
-                except ValueError:
-                    formatted_date = 'Date not available.'
-                    
-                data.append({
-                    'company': 'Edeeste',
-                    'week_number': f'{date.today().isocalendar()[1]}',
-                    'day': formatted_date,
-                    'province': province,
-                    'maintenance': maintenance
-                })
+        for (day, province), rows in df.groupby(['day', 'province'], sort = False):
+            maintenance = [TimeSlot(time, sectors.split(',')) for time, sectors in zip(rows.time, rows.sectors)]
+            formatted_date = parse_spanish_date(day)
+            formatted_date = str(formatted_date) if formatted_date else 'Date not available.'
+                
+            data.append(OutageRecord('Edeeste', week_number, formatted_date, province, maintenance))
                 
         return data
\ No newline at end of file
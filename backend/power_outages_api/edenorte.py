@@ -1,13 +1,12 @@
-import requests, locale, pandas as pd, io, os
+import unicodedata, pandas as pd, io
 from datetime import date, timedelta
 from .electric_providers import ElectricProvider
-from google import genai
+from .records import OutageRecord, TimeSlot
+from .dates import MONTHS, parse_spanish_date
 from dotenv import find_dotenv, load_dotenv
 
 path = find_dotenv()
 load_dotenv(path)
-# sets the language of the date class to spanish
-locale.setlocale(locale.LC_TIME, 'es_ES.UTF-8')
 
 class ModelError(Exception):
     pass
@@ -16,6 +15,19 @@ class ScrapeError(Exception):
     pass
 
 class Edenorte(ElectricProvider):
+    # the spreadsheet is only sent to Gemini when the link of the current week changes, so checking often is cheap,
+    # and the schedule of the next week, which is usually posted on Friday, is picked up on Monday
+    publication_windows = (((4, 5, 6, 0), 6, 22),)
+    timeout = 900
+    # every full refresh is a model call, so they never overlap, even across workers
+    max_concurrency = 1
+    # a new schedule is published once a week and is sometimes a day late, so a week without a successful refresh is normal
+    freshness_sla = timedelta(days = 8)
+    retryable_errors = (ModelError,)
+    # keywords of the column headers the prompt needs. every other column is dropped before the sheet is sent to the model
+    relevant_columns = ('fecha', 'dia', 'provincia', 'municipio', 'hora', 'sector', 'zona', 'barrio', 'localidad', 'paraje')
+    # the sheet is only pruned if one of these columns was recognized, so the sectors are never dropped
+    sector_columns = ('sector', 'zona', 'barrio', 'localidad', 'paraje')
     url = 'https://edenorte.com.do/category/programa-de-mantenimiento-de-redes/'
     def __init__(self):
         super().__init__(Edenorte.url)
@@ -39,36 +51,51 @@ class Edenorte(ElectricProvider):
         today = date.today()
         return (today - timedelta(days = today.weekday()))
     
-    def _get_link(self, monday: date = None) -> str:
+    @staticmethod
+    def _find_link(soup, monday: date) -> str:
         '''
-        Grabs the link for the maintenance data related to the current week
+        Grabs the link of the post with the maintenance data of the week that starts on monday
         Returns a string representation of the link
         '''
-        if not monday:
-            monday = self.get_monday()
-        link_tag = self.soup.find(lambda tag: tag.name == 'a' and 
-                              monday.strftime('%d') in tag.text and
-                              monday.strftime('%B') in tag.text
+        day, month = f'{monday.day:02d}', MONTHS[monday.month - 1]
+        link_tag = soup.find(lambda tag: tag.name == 'a' and 
+                              day in tag.text and
+                              month in tag.text
                               )
         try:
             return link_tag['href']
         except (KeyError, TypeError):
             raise ScrapeError('Error fetching link. Website structure may have changed, or data for the current week may not be available yet.')
+    
+    def _get_link(self, monday: date = None) -> str:
+        '''
+        Grabs the link for the maintenance data related to the current week
+        Returns a string representation of the link
+        '''
+        return self._find_link(self.soup, monday if monday else self.get_monday())
+    
+    @classmethod
+    def document_link(cls, soup) -> str | None:
+        try:
+            return cls._find_link(soup, cls.get_monday())
+        except ScrapeError:
+            return None
         
     def _get_file(self, monday: date = None):
         '''
-        Grabs the url for the download file and initiates the get request to download the file
-        Returns the content of the file in binary
+        Grabs the url for the download file and streams the file into memory
+        Returns a buffer with the contents of the file
         '''
         if not monday:
             monday = self.get_monday()
         soup = self.get_soup(self._get_link(monday=monday))
+        day, month = f'{monday.day:02d}', MONTHS[monday.month - 1]
         divs = soup.find_all('div', class_ = 'w3eden')
         
         for div in divs:
             download_link_div = div.find(lambda tag: tag.name == 'a' and 
-                                monday.strftime('%d') in tag.text and
-                                monday.strftime('%B') in tag.text and 
+                                day in tag.text and
+                                month in tag.text and 
                                 ('excel' in tag.text or 
                                 'EXCEL' in tag.text or
                                 'Excel' in tag.text)
@@ -80,25 +107,54 @@ class Edenorte(ElectricProvider):
                                 )
         
                 try:
-                    return requests.get(download_link_tag['data-downloadurl']).content
+                    return self.download(download_link_tag['data-downloadurl'])
                 except KeyError:
                     raise Exception('Error downloading file. Website structure may have changed.')
         
         # if the loop finishes without returning, we did not find a download link
         raise Exception('Error fetching download link. Website structure may have changed.')
         
-    def _prepare_data(self, monday: date = None):
+    @staticmethod
+    def _normalize(text) -> str:
+        return unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode().lower()
+    
+    @classmethod
+    def _shape_sheet(cls, df: pd.DataFrame) -> pd.DataFrame:
+        '''
+        Drops the empty rows and columns, the columns the output never uses, and the duplicated rows
+        Returns the smaller data frame
+        '''
+        df = df.dropna(how = 'all').dropna(axis = 1, how = 'all')
+        is_relevant = lambda value: any(keyword in cls._normalize(value) for keyword in cls.relevant_columns)
+        
+        # the sheet may start with a title, in which case the real header is one of the first rows
+        if sum(map(is_relevant, df.columns)) < 2:
+            for i, (_, row) in enumerate(df.head(10).iterrows()):
+                if sum(map(is_relevant, row.dropna())) >= 2:
+                    df = df.iloc[i + 1:].set_axis(row.values, axis = 1)
+                    break
+        
+        columns = [column for column in df.columns if is_relevant(column)]
+        has_sectors = any(keyword in cls._normalize(column) for column in columns for keyword in cls.sector_columns)
+        # if we cannot recognize the headers, we send everything rather than risk losing data
+        if len(columns) >= 2 and has_sectors:
+            df = df[columns]
+        
+        return df.drop_duplicates()
+    
+    def _prepare_data(self, monday: date = None, file: io.BytesIO = None):
         '''
-        Opens a file-like object in memory
-        Returns a pandas dataframe object created from the "file"
+        file (optional): the spreadsheet. Downloaded if it is not given
+        Reads the downloaded spreadsheet from memory
+        Returns a csv string created from the relevant data of the 'Publicacion Externa' sheet
         '''
-        excel_file = io.BytesIO(self._get_file(monday=monday))
-        df = pd.read_excel(excel_file, sheet_name='Publicacion Externa')
-        csv_formatted_data = df.to_csv(index=False)
+        df = pd.read_excel(file if file else self._get_file(monday=monday), sheet_name='Publicacion Externa')
+        csv_formatted_data = self._shape_sheet(df).to_csv(index=False)
         return csv_formatted_data
     
-    def _extract_from_csv(self, monday: date = None):
+    def _extract_from_csv(self, monday: date = None, file: io.BytesIO = None):
         '''
+        file (optional): the spreadsheet. Downloaded if it is not given
         Extracts and organized the relevant data and creates a csv file from the extracted data
         Returns a string representation of the extracted data
         '''
@@ -125,15 +181,11 @@ class Edenorte(ElectricProvider):
                 Your response should not contain any text outside of the csv data. Each row should have exactly four columns.
                 ''']
 
-        data = self._prepare_data(monday=monday)
+        data = self._prepare_data(monday=monday, file=file)
         prompt.append(data)
-        client = genai.Client(api_key = os.getenv('GEMINI_API_KEY'))
         
         try:
-            response = client.models.generate_content(
-                model = 'gemini-2.5-pro',
-                contents = prompt
-            )
+            response = self._generate(prompt)
         except Exception:
             raise ModelError('AI model not currently available. Please try again later or use a different model.')
     
@@ -142,36 +194,20 @@ class Edenorte(ElectricProvider):
     def _organize_data(self, data: str = None) -> list:
         '''
         Extracts and parses the data from the data frame object
-        Returns a list of dictionaries
+        Returns a list of OutageRecord objects
         '''
         formatted_csv = io.StringIO(data if data else self._extract_from_csv())
         df = pd.read_csv(formatted_csv)
+        week_number = date.today().isocalendar()[1]
         data = []
         
-        for day in df.day.unique():
-            for province in df.province.unique():
-                filtered_data = df[(df.day == day) & (df.province == province)]
-                if filtered_data.empty:
-                    continue
-                maintenance = []
-                for _, row in filtered_data.iterrows():
-                    maintenance.append({'time': row.time, 'sectors': row.sectors.split(',')})
+        for (day, province), rows in df.groupby(['day', 'province'], sort = False):
+            maintenance = [TimeSlot(time, sectors.split(',')) for time, sectors in zip(rows.time, rows.sectors)]
+            
+            # the model may return the date as text, in iso format, or as an Excel serial number
+            formatted_date = parse_spanish_date(day)
+            formatted_date = str(formatted_date) if formatted_date else 'Date not available.'
                 
-                # if the date is returned as an Excel serial number, convert it to a date time object and format it.
-                if isinstance(row.day, int):
-                    # an Excel date serial number represents n days from 1899-12-30. Adding those days gives the current date.
-                    day_to_append = (date.fromisoformat('1899-12-30') + timedelta(days = day))
-                else:
-                    day_to_append = day
-                    
-                data.append({
-                    'company': 'Edenorte',
-                    'week_number': f'{date.today().isocalendar()[1]}',
-                    'day': day_to_append,
-                    'province': province,
-                    'maintenance': maintenance
-                }) 
+            data.append(OutageRecord('Edenorte', week_number, formatted_date, province, maintenance))
                 
-        return data
-
-        
+        return data
\ No newline at end of file
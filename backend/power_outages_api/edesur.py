@@ -1,9 +1,13 @@
 import re
 from .electric_providers import ElectricProvider
-from datetime import date, datetime
-import locale
+from .records import OutageRecord, TimeSlot, parse_clock
+from .dates import parse_spanish_date
+from datetime import date
 
 class Edesur(ElectricProvider):
+    # the schedule is updated during the week, so we check for updates throughout the working day
+    publication_windows = ((range(7), 7, 20),)
+    timeout = 120
     time_pattern = r'\d{1,2}:\d{2} [aApP]\.?\s?[mM]\.?'
     url = 'https://www.edesur.com.do/enlaces-empresa/mantenimientos-programados/'
     def __init__(self):
@@ -26,7 +30,7 @@ class Edesur(ElectricProvider):
     def _parse_city(self, tag) -> list:
         """
         Obtains the different timeblocks and associated sectors for each city
-        Returns a list of dictonaries mapping time: timeblock, sectors: list of sectors
+        Returns a list of TimeSlot records
         """
         times = tag.find_all('h5', class_ = 'title-zona')
         sectors = tag.find_all(lambda tag: tag.name == 'p' and tag.text.strip(), class_ = False)
@@ -34,41 +38,32 @@ class Edesur(ElectricProvider):
         for time, sectors in zip(times, sectors):
             time = re.findall(Edesur.time_pattern, time.text)
             if len(time) < 2:
-                time = 'Time data not available.' 
-            else:
-                time = f'{time[0]} - {time[1]}' 
-            maintenance.append({'time': time, 'sectors': sectors.text.split(',')})
+                maintenance.append(TimeSlot('Time data not available.', sectors.text.split(',')))
+                continue
+            # we keep the parsed endpoints so that the interval does not have to be extracted again
+            maintenance.append(TimeSlot(f'{time[0]} - {time[1]}', sectors.text.split(','), parse_clock(time[0]), parse_clock(time[1])))
         
         return maintenance
         
     def _organize_data(self) -> list:
         """
         Scrapes and organizes the data for the scheduled maintenance for each day
-        Returns a list of dictionaries
+        Returns a list of OutageRecord objects
         """
-        locale.setlocale(locale.LC_TIME, 'es_ES.UTF-8')
+        week_number = date.today().isocalendar()[1]
         data = []
         for item in self._get_day_ids():
             day = self.soup.find('button', id = item + '-tab')
             if not day:
                 continue
             day = day.text.strip('\n').replace('\n', ' ')
+            formatted_date = parse_spanish_date(day)
+            formatted_date = str(formatted_date) if formatted_date else 'Date not available.'
             province_tags = self.soup.select(f'#{item} .accordion-item')
             for tag in province_tags:
                 province = tag.find('h4', class_ = 'mb-0')
                 if not province:
                     continue
-                try:
-                    formatted_date = str(datetime.strptime(day, '%A %d de %B, %Y').date())
-                except ValueError:
-                    formatted_date = 'Date not available.'
-                province = province.text.strip()
-                data.append({
-                    'company': 'Edesur',
-                    'week_number': f'{date.today().isocalendar()[1]}',
-                    'day': formatted_date,
-                    'province': province,
-                    'maintenance': self._parse_city(tag)
-                }) 
+                data.append(OutageRecord('Edesur', week_number, formatted_date, province.text, self._parse_city(tag)))
                 
         return data
\ No newline at end of file
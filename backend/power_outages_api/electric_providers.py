@@ -1,10 +1,55 @@
-import requests
+import requests, hashlib, io, json, os, time
 from bs4 import BeautifulSoup
+from collections import deque
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
+from google import genai
+
+@dataclass(slots = True)
+class TokenUsage:
+    provider: str
+    model: str
+    latency: float
+    prompt_tokens: int
+    output_tokens: int
+    total_tokens: int
+
+# the most recent model calls of every provider in this process
+usage_log = deque(maxlen = 500)
+# when set, every model call is also appended to this file as a json line, so usage can be compared across runs
+USAGE_LOG_PATH = os.getenv('TOKEN_USAGE_LOG')
 
 class ElectricProvider:
+    # every subclass registers itself here, so the scheduler picks up new providers automatically
+    registry = {}
+    
+    # scheduling settings. subclasses override them to match the cost of their scraper
+    # (weekdays, first hour, end hour) in local time when the schedule is usually published. Monday is 0
+    publication_windows = (((4, 5, 6, 0), 6, 22),)
+    poll_interval = timedelta(minutes = 30) # time between checks inside a publication window
+    idle_interval = timedelta(hours = 6)    # time between checks outside of them
+    timeout = 600                           # seconds before a refresh is abandoned
+    max_concurrency = 1                     # refreshes of the same provider allowed to run at once, across every worker
+    freshness_sla = timedelta(days = 1)     # maximum age of the data before it is reported as stale
+    retryable_errors = ()                   # server-side errors that are retried every 30 minutes
+    
+    url = None                              # the page that lists the schedule, used to check for updates
+    headers = None                          # headers sent with every request to the provider
+    
+    # downloaded documents are kept in memory, so we cap their size
+    max_download_bytes = 20 * 1024 * 1024
+    download_chunk_size = 64 * 1024
+    # seconds to connect, and seconds to wait between bytes, before a request to the provider is abandoned
+    request_timeout = (10, 30)
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        ElectricProvider.registry[cls.__name__] = cls
+    
     def __init__(self, url):
         self.url = url
         self.data = None
+        self.usage = []
         
     @staticmethod
     def get_soup(url, headers = None):
@@ -15,15 +60,115 @@ class ElectricProvider:
         Returns a soup objects created from the response
         '''
         try:
-            if headers:
-                response = requests.get(url, headers = headers)
-            else:
-                response = requests.get(url)
+            response = requests.get(url, headers = headers, timeout = ElectricProvider.request_timeout)
         except requests.exceptions.RequestException as e:
             raise Exception(f'Error fetching website: {e}')
         
         return BeautifulSoup(response.text, 'lxml')
     
+    @classmethod
+    def check_for_update(cls, validators: dict | None = None) -> dict | None:
+        '''
+        validators: the validators returned by the previous check, if any
+        Sends a conditional request for the page that lists the schedule. Most of these sites ignore
+        If-None-Match and If-Modified-Since, so the page is also fingerprinted: by the link returned by
+        document_link() when the provider defines one, and by its visible text otherwise
+        Returns the validators of the current page, or None if it has not changed
+        '''
+        validators = validators or {}
+        headers = dict(cls.headers or {})
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        try:
+            response = requests.get(cls.url, headers = headers, timeout = cls.request_timeout)
+        except requests.exceptions.RequestException as e:
+            raise Exception(f'Error fetching website: {e}')
+        if response.status_code == 304:
+            return None
+        
+        soup = BeautifulSoup(response.text, 'lxml')
+        # scripts and styles carry nonces and cache busters that change on every request
+        for tag in soup(['script', 'style', 'noscript']):
+            tag.decompose()
+        source = cls.document_link(soup) or soup.get_text(' ', strip = True)
+        current = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fingerprint': hashlib.sha1(source.encode()).hexdigest()
+        }
+        
+        return None if current['fingerprint'] == validators.get('fingerprint') else current
+    
+    @classmethod
+    def document_link(cls, soup) -> str | None:
+        '''
+        soup: the page that lists the schedule
+        Returns the link of the document the scraper would fetch right now, or None if the provider
+        does not define it or it is not on the page yet. Other posts on the page, like the schedule
+        of the next week, then leave the fingerprint untouched
+        '''
+        return None
+    
+    @classmethod
+    def download(cls, url, headers = None) -> io.BytesIO:
+        '''
+        url: a string representation of the url of the document
+        headers (optional): metadata pertaining to the request
+        Streams the document in chunks into a bounded in-memory buffer. Nothing is written to disk,
+        so overlapping scrapes never share a file
+        Returns the buffer positioned at the start of the document
+        '''
+        buffer = io.BytesIO()
+        try:
+            with requests.get(url, headers = headers, stream = True, timeout = cls.request_timeout) as response:
+                response.raise_for_status()
+                if int(response.headers.get('Content-Length') or 0) > cls.max_download_bytes:
+                    raise Exception(f'Error downloading file: the file is larger than {cls.max_download_bytes} bytes.')
+                for chunk in response.iter_content(chunk_size = cls.download_chunk_size):
+                    if buffer.tell() + len(chunk) > cls.max_download_bytes:
+                        raise Exception(f'Error downloading file: the file is larger than {cls.max_download_bytes} bytes.')
+                    buffer.write(chunk)
+        except requests.exceptions.RequestException as e:
+            raise Exception(f'Error downloading file: {e}')
+        
+        buffer.seek(0)
+        return buffer
+    
+    def _generate(self, contents, model = 'gemini-2.5-pro'):
+        '''
+        contents: the prompt and the payload for the model
+        model (optional): the name of the Gemini model
+        Sends the request to the model and records its latency and token usage
+        Returns the response
+        '''
+        client = genai.Client(api_key = os.getenv('GEMINI_API_KEY'))
+        start = time.perf_counter()
+        response = client.models.generate_content(model = model, contents = contents)
+        latency = time.perf_counter() - start
+        
+        metadata = response.usage_metadata
+        usage = TokenUsage(
+            provider = type(self).__name__,
+            model = model,
+            latency = latency,
+            prompt_tokens = (metadata and metadata.prompt_token_count) or 0,
+            output_tokens = (metadata and metadata.candidates_token_count) or 0,
+            total_tokens = (metadata and metadata.total_token_count) or 0
+        )
+        self.usage.append(usage)
+        usage_log.append(usage)
+        if USAGE_LOG_PATH:
+            try:
+                with open(USAGE_LOG_PATH, 'a') as log:
+                    log.write(json.dumps({'at': datetime.now(timezone.utc).isoformat(), **asdict(usage)}) + '\n')
+            except OSError as e:
+                print(f'Could not write the token usage to {USAGE_LOG_PATH}: {e}')
+        print(f'{usage.provider} used {usage.prompt_tokens} prompt tokens and {usage.output_tokens} output tokens in {latency:.1f}s.')
+        
+        return response
+    
     def _organize_data(self):
         pass
         
\ No newline at end of file
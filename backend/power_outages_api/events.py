@@ -0,0 +1,93 @@
+import asyncio, psycopg
+from sqlmodel import Session
+from .db import engine
+from .utils import CHANNEL, current_version
+
+class Broadcaster:
+    '''
+    Fans out data version notifications to every client connected to this worker.
+    Subscribers share a single asyncio.Event per version, so idle connections only cost a pending waiter.
+    '''
+    def __init__(self):
+        self.version = 0
+        self._updated = asyncio.Event()
+        # the delta between two versions is computed once and shared by every subscriber that needs it
+        self._deltas = {}
+
+    def publish(self, version: int) -> None:
+        '''
+        version: the data version committed by a refresh
+        Wakes up every waiting subscriber if the version is newer than the last one published
+        '''
+        if version <= self.version:
+            return
+        self.version = version
+        # new subscribers only ask for deltas up to the new version
+        self._deltas = {key: task for key, task in self._deltas.items() if key[1] >= version}
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+    async def wait(self, version: int, timeout: float) -> int:
+        '''
+        version: the last version seen by the subscriber
+        timeout: the maximum number of seconds to wait
+        Returns the latest version, which is unchanged if the timeout expired first
+        '''
+        while self.version <= version:
+            updated = self._updated
+            try:
+                async with asyncio.timeout(timeout):
+                    await updated.wait()
+            except TimeoutError:
+                break
+
+        return self.version
+
+    async def delta(self, since: int, latest: int, load) -> str:
+        '''
+        since: the last version seen by the subscriber
+        latest: the version the subscriber is being notified about
+        load: a blocking function that returns the serialized changes between two versions
+        Returns the changes, loading them in a thread only the first time they are requested
+        '''
+        key = (since, latest)
+        task = self._deltas.get(key)
+        if task is None:
+            task = self._deltas[key] = asyncio.ensure_future(asyncio.to_thread(load, since, latest))
+        try:
+            # a subscriber that disconnects must not cancel the query for everyone else
+            return await asyncio.shield(task)
+        except Exception:
+            if self._deltas.get(key) is task:
+                del self._deltas[key]
+            raise
+
+broadcaster = Broadcaster()
+
+def _conninfo() -> str:
+    '''
+    Returns the database url in a format that psycopg understands
+    '''
+    return engine.url.set(drivername = 'postgresql').render_as_string(hide_password = False)
+
+async def listen(broadcaster: Broadcaster = broadcaster) -> None:
+    '''
+    Listens for notifications sent by create_models() from any process and publishes them to the local subscribers
+    Reconnects if the connection to the database is lost
+    '''
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(_conninfo(), autocommit = True) as conn:
+                await conn.execute(f'LISTEN {CHANNEL}')
+                # catch up on anything committed before we started listening
+                broadcaster.publish(await asyncio.to_thread(_load_version))
+                async for notify in conn.notifies():
+                    broadcaster.publish(int(notify.payload))
+        except Exception as e:
+            # any failure would otherwise end the task, and the streams of this worker with it
+            print('Lost connection to the notification channel. Reconnecting in 5 seconds.', e)
+            await asyncio.sleep(5)
+
+def _load_version() -> int:
+    with Session(engine) as session:
+        return current_version(session)
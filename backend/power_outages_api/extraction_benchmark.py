@@ -0,0 +1,162 @@
+'''
+Measures the token usage and accuracy of the model-based extractions against stored documents,
+so that a change to the rendering or the prompts can be compared before and after.
+
+Record the documents of the current week once, and review the expected csv files by hand:
+    python -m power_outages_api.extraction_benchmark record fixtures/
+
+Run the extractions with the current settings, or sweep the Edeeste rendering settings:
+    python -m power_outages_api.extraction_benchmark run fixtures/ --report before.json
+    python -m power_outages_api.extraction_benchmark run fixtures/ --dpi 100 125 150 --side 1024 1536 --report after.json
+
+Compare two reports:
+    python -m power_outages_api.extraction_benchmark compare before.json after.json
+'''
+import argparse, io, json, os
+from .electric_providers import ElectricProvider
+from .edeeste import Edeeste
+from .edenorte import Edenorte
+
+# the settings used to record the expected output. the reference should be as accurate as possible
+REFERENCE_DPI = 200
+REFERENCE_SIDE = 3072
+
+def _offline(company_class) -> ElectricProvider:
+    '''
+    Returns a provider that does not fetch its website on creation
+    '''
+    provider = company_class.__new__(company_class)
+    ElectricProvider.__init__(provider, company_class.url)
+
+    return provider
+
+def _cells(records) -> set:
+    '''
+    Returns every (day, province, time, sector) combination of the records, ignoring case
+    '''
+    return {(record.day, record.province.lower(), slot.time.lower(), sector.lower())
+            for record in records for slot in record.maintenance for sector in slot.sectors}
+
+def score(expected: list, actual: list) -> dict:
+    '''
+    expected, actual: lists of OutageRecord objects
+    Returns the precision and recall of the extracted sectors
+    '''
+    expected, actual = _cells(expected), _cells(actual)
+    matched = len(expected & actual)
+
+    return {
+        'precision': round(matched / len(actual), 4) if actual else 0.0,
+        'recall': round(matched / len(expected), 4) if expected else 0.0
+    }
+
+def _extract(name: str, document: bytes, dpi: int = None, side: int = None) -> tuple:
+    '''
+    Returns the extracted csv text and the token usage of the model call
+    '''
+    if name == 'edeeste':
+        provider = _offline(Edeeste)
+        settings = (Edeeste.render_dpi, Edeeste.max_page_side)
+        Edeeste.render_dpi, Edeeste.max_page_side = dpi or settings[0], side or settings[1]
+        try:
+            text = provider._extract_from_pdf(file = io.BytesIO(document))
+        finally:
+            Edeeste.render_dpi, Edeeste.max_page_side = settings
+    else:
+        provider = _offline(Edenorte)
+        text = provider._extract_from_csv(file = io.BytesIO(document))
+
+    return text, provider.usage[-1]
+
+def _documents(directory: str) -> dict:
+    return {'edeeste': os.path.join(directory, 'edeeste.pdf'), 'edenorte': os.path.join(directory, 'edenorte.xlsx')}
+
+def record(directory: str) -> None:
+    '''
+    Downloads the documents of the current week and extracts them at the reference settings
+    '''
+    os.makedirs(directory, exist_ok = True)
+    documents = _documents(directory)
+    files = {'edeeste': Edeeste()._download_file(), 'edenorte': Edenorte()._get_file()}
+    for name, file in files.items():
+        with open(documents[name], 'wb') as f:
+            f.write(file.getvalue())
+        text, _ = _extract(name, file.getvalue(), REFERENCE_DPI, REFERENCE_SIDE)
+        with open(os.path.join(directory, f'{name}.csv'), 'w') as f:
+            f.write(text)
+        print(f'Recorded {name}. Check {name}.csv against the document before using it as the reference.')
+
+def run(directory: str, dpis: list = None, sides: list = None) -> list:
+    '''
+    Extracts every stored document with each combination of settings
+    Returns a list with the settings, token usage, and accuracy of each extraction
+    '''
+    results = []
+    for name, path in _documents(directory).items():
+        if not os.path.exists(path):
+            print(f'Skipping {name}. {path} does not exist.')
+            continue
+        with open(path, 'rb') as f:
+            document = f.read()
+        with open(os.path.join(directory, f'{name}.csv')) as f:
+            expected = _offline(Edeeste if name == 'edeeste' else Edenorte)._organize_data(data = f.read())
+        # the rendering settings only apply to the pdf
+        settings = [(dpi, side) for dpi in dpis or [None] for side in sides or [None]] if name == 'edeeste' else [(None, None)]
+        for dpi, side in settings:
+            text, usage = _extract(name, document, dpi, side)
+            actual = _offline(Edeeste if name == 'edeeste' else Edenorte)._organize_data(data = text)
+            result = {
+                'provider': name,
+                'dpi': dpi or (Edeeste.render_dpi if name == 'edeeste' else None),
+                'max_page_side': side or (Edeeste.max_page_side if name == 'edeeste' else None),
+                'prompt_tokens': usage.prompt_tokens,
+                'output_tokens': usage.output_tokens,
+                'latency': round(usage.latency, 2),
+                **score(expected, actual)
+            }
+            print(result)
+            results.append(result)
+
+    return results
+
+def compare(before: list, after: list) -> None:
+    '''
+    Prints the change in tokens and accuracy of every extraction that appears in both reports
+    '''
+    key = lambda result: (result['provider'], result['dpi'], result['max_page_side'])
+    previous = {key(result): result for result in before}
+    for result in after:
+        old = previous.get(key(result))
+        if not old:
+            continue
+        print(f"{result['provider']} dpi={result['dpi']} side={result['max_page_side']}: "
+              f"prompt tokens {old['prompt_tokens']} -> {result['prompt_tokens']}, "
+              f"recall {old['recall']} -> {result['recall']}, precision {old['precision']} -> {result['precision']}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'Benchmarks the model-based extractions against stored documents.')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+    commands.add_parser('record').add_argument('directory')
+    run_parser = commands.add_parser('run')
+    run_parser.add_argument('directory')
+    run_parser.add_argument('--dpi', type = int, nargs = '*')
+    run_parser.add_argument('--side', type = int, nargs = '*')
+    run_parser.add_argument('--report')
+    compare_parser = commands.add_parser('compare')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.directory)
+    elif args.command == 'run':
+        results = run(args.directory, args.dpi, args.side)
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump(results, f, indent = 2)
+    else:
+        with open(args.before) as before, open(args.after) as after:
+            compare(json.load(before), json.load(after))
+
+if __name__ == '__main__':
+    main()
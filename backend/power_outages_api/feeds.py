@@ -0,0 +1,110 @@
+import csv, hashlib, io
+from datetime import date, datetime, timedelta, timezone
+from .records import LOCAL_TZ
+
+CALENDAR_NAME = 'Apagones programados'
+PRODID = '-//apagonesrd.com//Apagones programados//ES'
+CSV_HEADER = ('company', 'province', 'day', 'time', 'starts_at', 'ends_at', 'sectors')
+
+def _escape(text: str) -> str:
+    '''
+    Escapes the characters that have a special meaning in iCalendar text values
+    '''
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def _fold(line: str) -> str:
+    '''
+    Splits a content line into chunks of at most 75 octets, as required by RFC 5545, without breaking multi-byte characters
+    '''
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line
+    chunks, current, size, limit = [], [], 0, 75
+    for char in line:
+        length = len(char.encode())
+        if size + length > limit:
+            chunks.append(''.join(current))
+            # continuation lines start with a space, which counts towards the limit
+            current, size, limit = [], 0, 74
+        current.append(char)
+        size += length
+    chunks.append(''.join(current))
+
+    return '\r\n '.join(chunks)
+
+def _utc(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+def _uid(outage, block, index: int) -> str:
+    '''
+    Builds an id that stays the same across refreshes, so calendar clients update events instead of duplicating them
+    '''
+    source = f'{outage.company}|{outage.province}|{outage.day}|{block.time}|{index}'
+    return f'{hashlib.sha1(source.encode()).hexdigest()}@apagonesrd.com'
+
+def _period(outage, block) -> list | None:
+    '''
+    Returns the DTSTART and DTEND lines of the block, or None if the event has no usable date
+    '''
+    if block.starts_at and block.ends_at:
+        return [f'DTSTART:{_utc(block.starts_at)}', f'DTEND:{_utc(block.ends_at)}']
+    
+    # without a parsed time block the event covers the whole day
+    try:
+        day = date.fromisoformat(outage.day)
+    except ValueError:
+        return None
+    
+    return [f'DTSTART;VALUE=DATE:{day:%Y%m%d}', f'DTEND;VALUE=DATE:{day + timedelta(days = 1):%Y%m%d}']
+
+def render_ics(outages, generated_at: datetime = None) -> bytes:
+    '''
+    outages: MaintenanceEvent objects loaded with their maintenance blocks
+    generated_at (optional): the timestamp of the feed. Defaults to now
+    Returns an iCalendar feed with one event per time block
+    '''
+    stamp = _utc(generated_at or datetime.now(timezone.utc))
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODID}', 'CALSCALE:GREGORIAN', 'METHOD:PUBLISH',
+             f'X-WR-CALNAME:{CALENDAR_NAME}', 'X-WR-TIMEZONE:America/Santo_Domingo']
+    for outage in outages:
+        for index, block in enumerate(outage.maintenance):
+            period = _period(outage, block)
+            if not period:
+                continue
+            sectors = ', '.join(block.sectors)
+            lines += [
+                'BEGIN:VEVENT',
+                f'UID:{_uid(outage, block, index)}',
+                f'DTSTAMP:{stamp}',
+                *period,
+                f'SUMMARY:{_escape("Apagón programado: " + outage.province)}',
+                f'LOCATION:{_escape(outage.province)}',
+                f'DESCRIPTION:{_escape(f"{outage.company}, {block.time}")}\\nSectores: {_escape(sectors)}',
+                'TRANSP:TRANSPARENT',
+                'END:VEVENT'
+            ]
+    lines.append('END:VCALENDAR')
+
+    return ('\r\n'.join(_fold(line) for line in lines) + '\r\n').encode()
+
+def render_csv(outages) -> bytes:
+    '''
+    outages: MaintenanceEvent objects loaded with their maintenance blocks
+    Returns a csv file with one row per time block
+    '''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for outage in outages:
+        for block in outage.maintenance:
+            writer.writerow((
+                outage.company,
+                outage.province,
+                outage.day,
+                block.time,
+                block.starts_at.astimezone(LOCAL_TZ).isoformat() if block.starts_at else '',
+                block.ends_at.astimezone(LOCAL_TZ).isoformat() if block.ends_at else '',
+                ', '.join(block.sectors)
+            ))
+
+    return buffer.getvalue().encode()
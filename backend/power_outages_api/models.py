@@ -1,7 +1,8 @@
 from sqlmodel import Field, SQLModel, Relationship
 from typing import List
+from datetime import datetime, timezone
 from pydantic import BaseModel
-from sqlalchemy import Column, String
+from sqlalchemy import Column, String, Index, text
 from sqlalchemy.dialects.postgresql import JSONB
 
     
@@ -15,9 +16,35 @@ class MaintenanceEventBase(BaseModel):
     day: str
     province: str
     maintenance: List[TimeSectorsBase] = []
+
+class MaintenanceEventKey(BaseModel):
+    week_number: int
+    company: str
+    day: str
+    province: str
+
+class OutageChanges(BaseModel):
+    version: int
+    added: List[MaintenanceEventBase] = []
+    modified: List[MaintenanceEventBase] = []
+    removed: List[MaintenanceEventKey] = []
+    
+class ProviderStatus(BaseModel):
+    name: str
+    schedule: dict
+    last_check: datetime | None = None
+    last_run: datetime | None = None
+    last_success: datetime | None = None
+    last_error: str | None = None
+    stale: bool
     
 class MaintenanceEvent(SQLModel, table = True):
     __tablename__ = 'maintenance_event'
+    # covering indexes for the /outages/ filters. the included columns let Postgres answer them from the index alone
+    __table_args__ = (
+        Index('ix_maintenance_event_week_province', 'week_number', text('lower(province)'), postgresql_include = ['id', 'company', 'day', 'province']),
+        Index('ix_maintenance_event_week_company', 'week_number', text('lower(company)'), postgresql_include = ['id', 'company', 'day', 'province']),
+    )
     id: int | None = Field(default = None, primary_key = True)
     week_number: int
     company: str
@@ -27,8 +54,35 @@ class MaintenanceEvent(SQLModel, table = True):
     
 class TimeSectors(SQLModel, table = True):
     __tablename__ = 'time_sectors'
+    # supports the lookup of the blocks that are active at a given time
+    __table_args__ = (
+        Index('ix_time_sectors_interval', 'starts_at', 'ends_at'),
+        # supports the sector filter, which looks for sectors with jsonb containment
+        Index('ix_time_sectors_sectors', 'sectors', postgresql_using = 'gin', postgresql_ops = {'sectors': 'jsonb_path_ops'}),
+    )
     id: int | None = Field(default = None, primary_key = True)
-    maintenance_event_id: int = Field(foreign_key = 'maintenance_event.id', ondelete = "CASCADE")
+    maintenance_event_id: int = Field(foreign_key = 'maintenance_event.id', ondelete = "CASCADE", index = True)
     time: str
     sectors: List[str] = Field(sa_column = Column(JSONB))
-    maintenance_event: MaintenanceEvent = Relationship(back_populates = 'maintenance')
\ No newline at end of file
+    # parsed from `time`. None if the day or the time block could not be parsed
+    starts_at: datetime | None = None
+    ends_at: datetime | None = None
+    maintenance_event: MaintenanceEvent = Relationship(back_populates = 'maintenance')
+    
+class DataVersion(SQLModel, table = True):
+    __tablename__ = 'data_version'
+    version: int | None = Field(default = None, primary_key = True)
+    created_at: datetime = Field(default_factory = lambda: datetime.now(timezone.utc))
+    added: List[dict] = Field(default = [], sa_column = Column(JSONB))
+    modified: List[dict] = Field(default = [], sa_column = Column(JSONB))
+    removed: List[dict] = Field(default = [], sa_column = Column(JSONB))
+    
+class ProviderRefresh(SQLModel, table = True):
+    __tablename__ = 'provider_refresh'
+    name: str = Field(primary_key = True)
+    last_check: datetime | None = None
+    last_run: datetime | None = None
+    last_success: datetime | None = None
+    last_error: str | None = None
+    # validators of the provider's listing page at the time of the last successful refresh
+    validators: dict | None = Field(default = None, sa_column = Column(JSONB))
@@ -0,0 +1,147 @@
+import cProfile, os, random, re, time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from sqlalchemy import event
+from .db import engine
+
+# every request is profiled when PROFILE_REQUESTS=1. otherwise only the requests that send
+# the PROFILE_HEADER with the value of PROFILE_TOKEN are, so clients cannot turn it on by themselves
+PROFILE_REQUESTS = os.getenv('PROFILE_REQUESTS', '0') == '1'
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')
+PROFILE_HEADER = b'x-profile'
+# when set, a fraction of the profiled requests also write a full cProfile dump to this directory
+PROFILE_DIR = os.getenv('PROFILE_DIR')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0.1))
+
+@dataclass(slots = True)
+class RequestProfile:
+    sql_count: int = 0
+    sql_seconds: float = 0.0
+    spans: dict = field(default_factory = dict)
+    marks: dict = field(default_factory = dict)
+    profiler: cProfile.Profile | None = None
+    depth: int = 0
+
+    def server_timing(self, total: float, payload: int | None) -> str:
+        '''
+        total: the seconds between the request and the start of the response
+        payload: the size of the response body, if it is known
+        Returns the value of the Server-Timing header, with every duration in milliseconds
+        '''
+        metrics = [f'sql;dur={self.sql_seconds * 1000:.2f};desc="{self.sql_count} statements"']
+        metrics += [f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.spans.items()]
+        metrics += [f'{name};desc="{value}"' for name, value in self.marks.items()]
+        if payload is not None:
+            metrics.append(f'payload;desc="{payload} bytes"')
+        metrics.append(f'total;dur={total * 1000:.2f}')
+
+        return ', '.join(metrics)
+
+# the profile of the request being handled. FastAPI copies the context into the threads that run
+# sync routes and dependencies, so the same object is visible from the route and the engine events
+_current: ContextVar[RequestProfile | None] = ContextVar('request_profile', default = None)
+
+@contextmanager
+def span(name: str):
+    '''
+    name: the name of the step in the Server-Timing header
+    Times the block when the request is being profiled. Sampled requests are also profiled in full inside their spans
+    '''
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+
+    # nested spans are timed on their own, but only the outermost one switches the profiler on and off
+    profile.depth += 1
+    if profile.profiler and profile.depth == 1:
+        profile.profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.spans[name] = profile.spans.get(name, 0.0) + time.perf_counter() - start
+        if profile.profiler and profile.depth == 1:
+            profile.profiler.disable()
+        profile.depth -= 1
+
+def mark(name: str, value) -> None:
+    '''
+    Adds a description-only entry, such as a cache hit, to the Server-Timing header of a profiled request
+    '''
+    profile = _current.get()
+    if profile is not None:
+        profile.marks[name] = value
+
+@event.listens_for(engine, 'before_cursor_execute')
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('profile_start', []).append(time.perf_counter())
+
+@event.listens_for(engine, 'after_cursor_execute')
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is None or not conn.info.get('profile_start'):
+        return
+    profile.sql_count += 1
+    profile.sql_seconds += time.perf_counter() - conn.info['profile_start'].pop()
+
+def _dump(profile: RequestProfile, path: str) -> None:
+    '''
+    Writes the cProfile stats of a sampled request to PROFILE_DIR, where they can be read with pstats or snakeviz
+    '''
+    name = re.sub(r'[^\w]+', '_', path).strip('_') or 'root'
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok = True)
+        profile.profiler.dump_stats(os.path.join(PROFILE_DIR, f'{datetime.now():%Y%m%dT%H%M%S%f}-{name}.prof'))
+    except OSError as e:
+        print(f'Could not write the profile of {path}: {e}')
+
+class ProfilingMiddleware:
+    '''
+    ASGI middleware that profiles opted-in requests and reports the results in a Server-Timing header.
+    Requests that are not profiled are passed through untouched
+    '''
+    def __init__(self, app):
+        self.app = app
+
+    def _enabled(self, scope) -> bool:
+        if scope['type'] != 'http':
+            return False
+        if PROFILE_REQUESTS:
+            return True
+
+        return bool(PROFILE_TOKEN) and dict(scope['headers']).get(PROFILE_HEADER) == PROFILE_TOKEN.encode()
+
+    async def __call__(self, scope, receive, send):
+        if not self._enabled(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        if PROFILE_DIR and random.random() < PROFILE_SAMPLE_RATE:
+            profile.profiler = cProfile.Profile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start':
+                total = time.perf_counter() - start
+                headers = list(message.get('headers', []))
+                length = dict(headers).get(b'content-length')
+                payload = int(length) if length else None
+                headers.append((b'server-timing', profile.server_timing(total, payload).encode()))
+                message = {**message, 'headers': headers}
+                print(f"Profiled {scope['method']} {scope['path']}: {total * 1000:.1f} ms, "
+                      f'{profile.sql_count} statements in {profile.sql_seconds * 1000:.1f} ms, {payload} bytes')
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            # routes without spans leave the profiler empty
+            if profile.profiler and profile.spans:
+                _dump(profile, scope['path'])
@@ -0,0 +1,139 @@
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from sys import intern
+
+# the Dominican Republic does not observe daylight saving time
+LOCAL_TZ = timezone(timedelta(hours = -4), 'AST')
+CLOCK_PATTERN = re.compile(r'(\d{1,2}):(\d{2})\s?([aApP])\.?\s?[mM]\.?')
+
+# the same provinces, times and sectors are repeated across hundreds of rows every week,
+# so we intern them to keep a single copy of each string in memory
+
+def _label(value) -> str:
+    '''
+    value: a raw label extracted by a scraper
+    Returns the stripped and interned string
+    '''
+    return intern(str(value).strip())
+
+def _to_time(match) -> time | None:
+    hour, minute, meridiem = int(match[1]), int(match[2]), match[3].lower()
+    if hour > 12 or minute > 59:
+        return None
+    
+    return time(hour % 12 + (12 if meridiem == 'p' else 0), minute)
+
+def parse_clock(text: str) -> time | None:
+    '''
+    text: a time of day in the following format: '9:20 a.m.'
+    Returns a time object, or None if the text could not be parsed
+    '''
+    match = CLOCK_PATTERN.search(text)
+    
+    return _to_time(match) if match else None
+
+def parse_time_range(text: str) -> tuple:
+    '''
+    text: a time block in the following format: '9:20 a.m. - 3:20 p.m.'
+    Returns a tuple with the start and end times, or (None, None) if the text could not be parsed
+    '''
+    clocks = [_to_time(match) for match in CLOCK_PATTERN.finditer(text)]
+    if len(clocks) < 2 or not (clocks[0] and clocks[1]):
+        return None, None
+    
+    return clocks[0], clocks[1]
+
+@dataclass(slots = True)
+class TimeSlot:
+    time: str
+    sectors: list[str]
+    start: time | None = None
+    end: time | None = None
+
+    def __post_init__(self):
+        self.time = _label(self.time) if isinstance(self.time, str) else 'Time data not available.'
+        self.sectors = [_label(sector) for sector in self.sectors if str(sector).strip()]
+        if self.start is None or self.end is None:
+            self.start, self.end = parse_time_range(self.time)
+
+    def to_dict(self) -> dict:
+        return {'time': self.time, 'sectors': self.sectors}
+
+@dataclass(slots = True)
+class OutageRecord:
+    company: str
+    week_number: int
+    day: str
+    province: str
+    maintenance: list[TimeSlot]
+
+    def __post_init__(self):
+        self.company = intern(self.company)
+        self.week_number = int(self.week_number)
+        self.day = _label(self.day)
+        self.province = _label(self.province)
+
+    @classmethod
+    def from_model(cls, event) -> 'OutageRecord':
+        '''
+        event: a MaintenanceEvent loaded with its maintenance relationship
+        Returns the record representation of the stored event
+        '''
+        maintenance = sorted(event.maintenance, key = lambda m: m.id)
+        return cls(event.company, event.week_number, event.day, event.province,
+                   [TimeSlot(m.time, m.sectors) for m in maintenance])
+
+    @property
+    def key(self) -> tuple:
+        '''
+        Returns the tuple that identifies the event across refreshes
+        '''
+        return (self.week_number, self.company, self.day, self.province)
+
+    @property
+    def event_date(self) -> date | None:
+        '''
+        Returns the day of the event as a date object, or None if it is not available
+        '''
+        try:
+            return date.fromisoformat(self.day)
+        except ValueError:
+            return None
+
+    def interval(self, slot: TimeSlot) -> tuple:
+        '''
+        slot: one of the time slots of the event
+        Returns the start and end of the slot as timezone-aware datetimes, or (None, None) if they are not available
+        '''
+        day = self.event_date
+        if not (day and slot.start and slot.end):
+            return None, None
+        start = datetime.combine(day, slot.start, LOCAL_TZ)
+        end = datetime.combine(day, slot.end, LOCAL_TZ)
+        # blocks that end before they start run past midnight
+        if end <= start:
+            end += timedelta(days = 1)
+        
+        return start, end
+
+    def time_sector_rows(self, event_id: int) -> list:
+        '''
+        event_id: the id of the stored maintenance event
+        Returns the values for a bulk insert into the time_sectors table
+        '''
+        rows = []
+        for slot in self.maintenance:
+            start, end = self.interval(slot)
+            rows.append({'maintenance_event_id': event_id, 'time': slot.time, 'sectors': slot.sectors, 'starts_at': start, 'ends_at': end})
+        
+        return rows
+
+    def event_row(self) -> dict:
+        '''
+        Returns the values for a bulk insert into the maintenance_event table
+        '''
+        return {'week_number': self.week_number, 'company': self.company, 'day': self.day, 'province': self.province}
+
+    def to_dict(self) -> dict:
+        return {**self.event_row(), 'maintenance': [slot.to_dict() for slot in self.maintenance]}
@@ -1,25 +1,46 @@
-import asyncio
+import json, os, hashlib
 from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlmodel import Session, select
+from sqlmodel import Session, select, func
+from pydantic import TypeAdapter
 from typing import Annotated, List
-from .models import MaintenanceEvent, MaintenanceEventBase
+from .models import MaintenanceEvent, MaintenanceEventBase, OutageChanges, TimeSectors, ProviderStatus
+from .records import LOCAL_TZ
 from .db import engine
-from .utils import main, create_db
+from .utils import refresh, current_version, collect_changes, provider_status, VersionExpired
+from .electric_providers import ElectricProvider
+from .events import broadcaster
+from .cache import ResultCache
+from .feeds import render_ics, render_csv
+from .scheduling import PollingTrigger
+from .dates import parse_spanish_date
+from .profiling import span, mark
 from sqlalchemy.orm import selectinload
-from datetime import date
+from datetime import date, datetime, timedelta
 from sqlalchemy.exc import ProgrammingError
 
+SSE_KEEPALIVE_SECONDS = 15
+SSE_RETRY_MS = 10_000
+# time blocks never span more than a day, which bounds the index scan for active outages
+MAX_OUTAGE_DURATION = timedelta(days = 1)
+
+# seconds that calendar clients and proxies may reuse a feed before revalidating it with its ETag
+FEED_MAX_AGE = 300
+# total size of the rendered /outages/ responses and feeds kept in memory by each worker
+OUTAGES_CACHE_MAX_BYTES = int(os.getenv('OUTAGES_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+# rough size of a cache entry besides its body, so that empty results for arbitrary filters still count towards the limit
+OUTAGES_CACHE_ENTRY_BYTES = 512
+
 router = APIRouter()
+outages_cache = ResultCache(OUTAGES_CACHE_MAX_BYTES, OUTAGES_CACHE_ENTRY_BYTES)
+outages_adapter = TypeAdapter(List[MaintenanceEventBase])
 scheduler = BackgroundScheduler()
 
-def cron_job():
-    create_db()
-    asyncio.run(main())
-
-scheduler.add_job(cron_job, CronTrigger(hour=0, minute=0, second=0))
+for provider in ElectricProvider.registry.values():
+    scheduler.add_job(refresh, PollingTrigger(provider), args = [provider], id = provider.__name__,
+                      max_instances = provider.max_concurrency, coalesce = True)
 scheduler.start()
 
 def get_session():
@@ -28,22 +49,277 @@ def get_session():
         
 SessionDep = Annotated[Session, Depends(get_session)]
 
-@router.get('/outages/', response_model = List[MaintenanceEventBase])
-def outages(db: SessionDep):
+def _normalize(value: str | None) -> str | None:
+    return ' '.join(value.split()).lower() if value and value.strip() else None
+
+# the week served for each data version and day. it only changes when one of them does
+_served_weeks = {}
+
+def _find_week(db: Session, today: date) -> tuple:
+    '''
+    Returns the week number and year of the current week, and False, if it has any events.
+    Otherwise returns the most recent week before it that does, and True
+    '''
+    week_number, year = today.isocalendar()[1], today.year
+    current = select(MaintenanceEvent.id). \
+        where(MaintenanceEvent.week_number == week_number, MaintenanceEvent.day.ilike(f'%{year}%')).limit(1)
+    if db.exec(current).first() is not None:
+        return week_number, year, False
     
-    conditions = [MaintenanceEvent.week_number == date.today().isocalendar()[1],
-                  MaintenanceEvent.day.ilike(f'%{date.today().year}%')]
-    statement = select(MaintenanceEvent)
+    # days that are not ISO dates, like 'Date not available.', sort after the digits and are never picked
+    monday = today - timedelta(days = today.weekday())
+    latest = select(MaintenanceEvent.day).where(MaintenanceEvent.day < monday.isoformat()). \
+        order_by(MaintenanceEvent.day.desc()).limit(1)
+    last_day = parse_spanish_date(db.exec(latest).first())
+    if not last_day:
+        return week_number, year, False
     
+    return last_day.isocalendar()[1], last_day.year, True
+
+def _resolve(db: Session) -> tuple:
+    '''
+    Returns the current data version, and the week number, year, and staleness of the week to serve.
+    Providers publish the new week some time after it starts, so until then we serve the last known good week
+    '''
     try:
-        statement = statement.where(*conditions). \
-            order_by(MaintenanceEvent.province, MaintenanceEvent.day). \
-                options(selectinload(MaintenanceEvent.maintenance))
-        outages = db.exec(statement).all()
+        version = current_version(db)
+        today = date.today()
+        # other threads may clear the dict at any time, so the result is kept in a local variable
+        served = _served_weeks.get((version, today))
+        if served is None:
+            served = _find_week(db, today)
+            if len(_served_weeks) > 16:
+                _served_weeks.clear()
+            _served_weeks[(version, today)] = served
+    except ProgrammingError:
+        raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = "Data not found.")
+    
+    return version, *served
+
+def _week_headers(version: int, week_number: int, year: int, stale: bool) -> dict:
+    headers = {'X-Data-Version': str(version), 'X-Data-Week': f'{year}-W{week_number:02d}'}
+    if stale:
+        headers['X-Data-Stale'] = 'true'
+    
+    return headers
+
+def _outages_key(kind: str, week_number: int, year: int, province: str | None, company: str | None,
+                 day: date | None, sector: str | None) -> tuple:
+    '''
+    kind: the format of the rendered response
+    Returns the normalized filters of the served week, used as the cache key
+    '''
+    sector = sector.strip() if sector and sector.strip() else None
+    
+    return (kind, week_number, year, _normalize(province), _normalize(company), day, sector)
+
+def _etag(key: tuple, version: int) -> str:
+    return '"' + hashlib.sha1(repr((version, key)).encode()).hexdigest()[:20] + '"'
+
+def _cached(db: Session, key: tuple, render, version: int) -> bytes:
+    '''
+    key: the cache key returned by _outages_key()
+    render: a function that turns the matching events into the response body
+    version: the current data version
+    Returns the rendered body, from the cache when possible
+    '''
+    try:
+        # the version is read before the data, so a refresh that lands in between can only make the entry newer, never staler
+        body = outages_cache.get(key, version)
+        mark('cache', 'miss' if body is None else 'hit')
+        if body is None:
+            # the query span includes the ORM hydration of the rows, and the serialize span the validation and encoding
+            with span('query'):
+                outages = _query_outages(db, *key[1:])
+            with span('serialize'):
+                body = render(outages)
+            # empty results are cached too, so repeated misses do not query the database every time
+            outages_cache.set(key, version, body)
     except ProgrammingError:
         raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = "Data not found.")
     
+    return body
+
+def _query_outages(db: Session, week_number: int, year: int, province: str | None, company: str | None,
+                   day: date | None, sector: str | None) -> list:
+    '''
+    Returns the events that match the normalized filters, loaded with their time blocks
+    '''
+    conditions = [MaintenanceEvent.week_number == week_number,
+                  MaintenanceEvent.day.ilike(f'%{year}%')]
+    if province:
+        conditions.append(func.lower(MaintenanceEvent.province) == province)
+    if company:
+        conditions.append(func.lower(MaintenanceEvent.company) == company)
+    if day:
+        conditions.append(MaintenanceEvent.day == day.isoformat())
+    
+    maintenance = MaintenanceEvent.maintenance
+    if sector:
+        # jsonb containment is answered by the GIN index on time_sectors.sectors
+        affects_sector = TimeSectors.sectors.contains([sector])
+        conditions.append(MaintenanceEvent.id.in_(select(TimeSectors.maintenance_event_id).where(affects_sector)))
+        maintenance = maintenance.and_(affects_sector)
+    
+    statement = select(MaintenanceEvent).where(*conditions). \
+        order_by(MaintenanceEvent.province, MaintenanceEvent.day). \
+            options(selectinload(maintenance))
+    
+    return db.exec(statement).all()
+
+def _render_json(outages) -> bytes:
     if not outages:
+        return b''
+    
+    return outages_adapter.dump_json(outages_adapter.validate_python(outages, from_attributes = True))
+
+@router.get('/outages/', response_model = List[MaintenanceEventBase])
+def outages(db: SessionDep, province: str | None = None, company: str | None = None, day: date | None = None, sector: str | None = None):
+    '''
+    province, company (optional): case-insensitive filters
+    day (optional): only return the events of that day
+    sector (optional): only return the time blocks that affect that sector. It must match the sector name exactly
+    Returns the events of the current week, or of the last week with data, marked with X-Data-Stale, if the
+    current week has not been published yet. Rendered responses are cached per filter until the data version changes
+    '''
+    version, week_number, year, stale = _resolve(db)
+    body = _cached(db, _outages_key('json', week_number, year, province, company, day, sector), _render_json, version)
+    
+    if not body:
         raise HTTPException(status_code = status.HTTP_404_NOT_FOUND, detail = "Data not found.")
+    
+    # clients can pass the version to /outages/changes to poll for updates
+    return Response(content = body, media_type = 'application/json', headers = _week_headers(version, week_number, year, stale))
 
-    return outages
\ No newline at end of file
+def _feed(request: Request, db: Session, kind: str, filters: tuple, render, media_type: str, filename: str) -> Response:
+    '''
+    kind: the format of the feed
+    filters: the province, company, and sector filters
+    Serves a feed rendered from the events that match the filters
+    Answers 304 without touching the events if the client already has the current version of the feed
+    '''
+    version, week_number, year, stale = _resolve(db)
+    province, company, sector = filters
+    key = _outages_key(kind, week_number, year, province, company, None, sector)
+    etag = _etag(key, version)
+    headers = {'ETag': etag, 'Cache-Control': f'public, max-age={FEED_MAX_AGE}', **_week_headers(version, week_number, year, stale)}
+    
+    if_none_match = request.headers.get('If-None-Match', '')
+    if if_none_match.strip() == '*' or etag in (tag.strip().removeprefix('W/') for tag in if_none_match.split(',')):
+        return Response(status_code = status.HTTP_304_NOT_MODIFIED, headers = headers)
+    
+    body = _cached(db, key, render, version)
+    headers['Content-Disposition'] = f'inline; filename="{filename}"'
+    
+    return Response(content = body, media_type = media_type, headers = headers)
+
+@router.get('/outages/feed.ics', response_class = Response)
+def feed_ics(request: Request, db: SessionDep, province: str | None = None, company: str | None = None, sector: str | None = None):
+    '''
+    province, company, sector (optional): the same filters as /outages/
+    Returns an iCalendar feed of the current week that calendar clients can subscribe to
+    '''
+    return _feed(request, db, 'ics', (province, company, sector), render_ics, 'text/calendar; charset=utf-8', 'apagones.ics')
+
+@router.get('/outages/feed.csv', response_class = Response)
+def feed_csv(request: Request, db: SessionDep, province: str | None = None, company: str | None = None, sector: str | None = None):
+    '''
+    province, company, sector (optional): the same filters as /outages/
+    Returns the time blocks of the current week as a csv file
+    '''
+    return _feed(request, db, 'csv', (province, company, sector), render_csv, 'text/csv; charset=utf-8', 'apagones.csv')
+
+@router.get('/outages/providers', response_model = List[ProviderStatus])
+def providers(db: SessionDep):
+    '''
+    Returns the schedule and the freshness of the data of every registered provider
+    '''
+    try:
+        return [provider_status(provider, db) for provider in ElectricProvider.registry.values()]
+    except ProgrammingError:
+        raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = "Data not found.")
+
+@router.get('/outages/active', response_model = List[MaintenanceEventBase])
+def active(db: SessionDep, at: datetime | None = None):
+    '''
+    at (optional): the time to check. Defaults to the current time in the Dominican Republic
+    Returns the events with a time block in progress at that time, including only the active blocks
+    '''
+    if not at:
+        at = datetime.now(LOCAL_TZ)
+    elif not at.tzinfo:
+        at = at.replace(tzinfo = LOCAL_TZ)
+    
+    is_active = (TimeSectors.starts_at <= at) & (TimeSectors.starts_at > at - MAX_OUTAGE_DURATION) & (TimeSectors.ends_at > at)
+    statement = select(MaintenanceEvent). \
+        where(MaintenanceEvent.id.in_(select(TimeSectors.maintenance_event_id).where(is_active))). \
+            order_by(MaintenanceEvent.province, MaintenanceEvent.day). \
+                options(selectinload(MaintenanceEvent.maintenance.and_(is_active)))
+    
+    try:
+        return db.exec(statement).all()
+    except ProgrammingError:
+        raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = "Data not found.")
+
+@router.get('/outages/changes', response_model = OutageChanges, responses = {
+    204: {'description': 'No changes since the given version.'},
+    410: {'description': 'The version is too old. Reload the data from /outages/ instead.'}
+})
+def changes(db: SessionDep, since: int):
+    '''
+    since: the last data version seen by the client, from the X-Data-Version header of /outages/
+    Returns the events added, modified, and removed after that version, merged into a single delta
+    '''
+    try:
+        delta = collect_changes(db, since)
+    except VersionExpired:
+        raise HTTPException(status_code = status.HTTP_410_GONE, detail = "Version too old. Reload the data from /outages/.")
+    except ProgrammingError:
+        raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = "Data not found.")
+    
+    if not delta:
+        return Response(status_code = status.HTTP_204_NO_CONTENT)
+    
+    return delta
+
+def _load_changes(since: int, until: int) -> str:
+    with Session(engine) as session:
+        delta = collect_changes(session, since, until)
+    
+    return delta.model_dump_json() if delta else ''
+
+@router.get('/outages/stream', response_class = StreamingResponse)
+async def stream(request: Request, since: int | None = None, delta: bool = False):
+    '''
+    since (optional): the last data version seen by the client. Defaults to the current version
+    delta (optional): whether to include the changes with each notification
+    Streams a server-sent event every time a refresh commits a new data version
+    '''
+    # browsers send the id of the last event they received when they reconnect
+    last_event_id = request.headers.get('Last-Event-ID')
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    elif since is None:
+        since = broadcaster.version
+    
+    async def events():
+        version = since
+        yield f'retry: {SSE_RETRY_MS}\n\n'
+        while True:
+            latest = await broadcaster.wait(version, timeout = SSE_KEEPALIVE_SECONDS)
+            if latest <= version:
+                # comments keep idle connections from being closed by proxies
+                yield ': keepalive\n\n'
+                continue
+            
+            data = ''
+            if delta:
+                try:
+                    data = await broadcaster.delta(version, latest, _load_changes)
+                except Exception as e:
+                    # clients fall back to fetching the data when the event has no changes
+                    print('Could not load the changes for the stream:', e)
+            yield f'id: {latest}\nevent: version\ndata: {data or json.dumps({"version": latest})}\n\n'
+            version = latest
+    
+    return StreamingResponse(events(), media_type = 'text/event-stream', headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
\ No newline at end of file
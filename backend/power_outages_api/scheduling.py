@@ -0,0 +1,68 @@
+from apscheduler.triggers.base import BaseTrigger
+from datetime import datetime, time, timedelta
+from .records import LOCAL_TZ
+
+def in_window(company_class, at: datetime) -> bool:
+    '''
+    company_class: a registered ElectricProvider subclass
+    at: a timezone-aware datetime
+    Returns whether the provider usually publishes its schedule at that moment
+    '''
+    local = at.astimezone(LOCAL_TZ)
+
+    return any(local.weekday() in weekdays and start <= local.hour < end
+               for weekdays, start, end in company_class.publication_windows)
+
+def _next_window(company_class, after: datetime) -> datetime | None:
+    '''
+    Returns the start of the next publication window of the provider, or None if it has none
+    '''
+    local = after.astimezone(LOCAL_TZ)
+    starts = []
+    for offset in range(8):
+        day = local.date() + timedelta(days = offset)
+        for weekdays, start, _ in company_class.publication_windows:
+            opening = datetime.combine(day, time(start), LOCAL_TZ)
+            if day.weekday() in weekdays and opening > local:
+                starts.append(opening)
+
+    return min(starts, default = None)
+
+def next_check(company_class, after: datetime) -> datetime:
+    '''
+    company_class: a registered ElectricProvider subclass
+    after: a timezone-aware datetime
+    Returns when the provider should be checked next: every poll_interval inside a publication window,
+    and every idle_interval outside of them, but never later than the opening of the next window
+    '''
+    if in_window(company_class, after):
+        return after + company_class.poll_interval
+    candidate = after + company_class.idle_interval
+    opening = _next_window(company_class, after)
+
+    return min(candidate, opening) if opening else candidate
+
+def describe(company_class) -> dict:
+    '''
+    company_class: a registered ElectricProvider subclass
+    Returns a json-friendly description of the polling schedule of the provider
+    '''
+    return {
+        'poll_interval_minutes': company_class.poll_interval.total_seconds() / 60,
+        'idle_interval_minutes': company_class.idle_interval.total_seconds() / 60,
+        'publication_windows': [{'weekdays': list(weekdays), 'start_hour': start, 'end_hour': end}
+                                for weekdays, start, end in company_class.publication_windows]
+    }
+
+class PollingTrigger(BaseTrigger):
+    '''
+    apscheduler trigger that fires often while a provider usually publishes its schedule, and backs off otherwise
+    '''
+    def __init__(self, company_class):
+        self.company_class = company_class
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        return next_check(self.company_class, previous_fire_time or now)
+
+    def __str__(self):
+        return f'polling[{self.company_class.__name__}]'
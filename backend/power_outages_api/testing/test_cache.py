@@ -0,0 +1,42 @@
+from ..cache import ResultCache
+
+class TestResultCache:
+    def test_lru_eviction(self):
+        cache = ResultCache(max_bytes=10)
+        cache.set('a', 1, b'1234')
+        cache.set('b', 1, b'1234')
+        assert cache.get('a', 1) == b'1234'
+        cache.set('c', 1, b'1234')
+        
+        # 'b' was the least recently used entry
+        assert cache.get('b', 1) is None
+        assert cache.get('a', 1) == b'1234'
+        assert cache.get('c', 1) == b'1234'
+        assert cache.size == 8
+    
+    def test_oversized_values_are_skipped(self):
+        cache = ResultCache(max_bytes=4)
+        cache.set('a', 1, b'12345')
+        assert len(cache) == 0
+    
+    def test_version_invalidation(self):
+        cache = ResultCache(max_bytes=100)
+        cache.set('a', 1, b'old')
+        assert cache.get('a', 2) is None
+        assert len(cache) == 0
+        
+        # a request that read the previous version cannot store its stale result
+        cache.set('a', 1, b'old')
+        assert cache.get('a', 2) is None
+        cache.set('a', 2, b'new')
+        assert cache.get('a', 1) is None
+        assert cache.get('a', 2) == b'new'
+    
+    def test_empty_values_are_bounded(self):
+        cache = ResultCache(max_bytes=10, entry_overhead=4)
+        for key in 'abcd':
+            cache.set(key, 1, b'')
+        # empty results are cached, but each one still takes up room
+        assert cache.get('d', 1) == b''
+        assert cache.get('a', 1) is None
+        assert cache.size == 8
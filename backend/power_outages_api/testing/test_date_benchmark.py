@@ -0,0 +1,7 @@
+from ..date_benchmark import measure
+
+class TestDateBenchmark:
+    def test_measure(self):
+        timings = measure(number=70, repeat=1)
+        assert set(timings) == {'cold', 'warm', 'strptime'}
+        assert all(microseconds > 0 for microseconds in timings.values())
@@ -0,0 +1,69 @@
+from ..dates import parse_spanish_date, format_spanish_date, WEEKDAYS, MONTHS
+from .test_data import TEST_MONDAY, TEST_MONDAY_ISO
+from datetime import date, datetime
+import numpy as np
+import pytest
+
+class TestDates:
+    def test_format_spanish_date(self):
+        assert format_spanish_date(TEST_MONDAY_ISO) == TEST_MONDAY
+        assert format_spanish_date(date(2025, 9, 17)) == 'miércoles 17 de septiembre'
+        assert format_spanish_date(date(2026, 1, 3)) == 'sábado 03 de enero'
+
+    def test_round_trip(self):
+        day = date(2025, 1, 1)
+        for offset in range(366):
+            current = date.fromordinal(day.toordinal() + offset)
+            assert parse_spanish_date(format_spanish_date(current), reference=current) == current
+
+    @pytest.mark.parametrize('value, expected', [
+        ('Lunes 03 de Noviembre, 2025', date(2025, 11, 3)),
+        ('miércoles 5 de noviembre del 2025', date(2025, 11, 5)),
+        ('MIERCOLES 05 DE NOVIEMBRE', date(2025, 11, 5)),
+        ('sabado 8 de noviembre', date(2025, 11, 8)),
+        ('martes 16 de setiembre', date(2025, 9, 16)),
+        ('2025-11-04', date(2025, 11, 4)),
+        ('2025-11-04 00:00:00', date(2025, 11, 4)),
+        (45965, date(2025, 11, 4)),
+        ('45965', date(2025, 11, 4)),
+        (np.int64(45965), date(2025, 11, 4)),
+        (45965.0, date(2025, 11, 4)),
+        (datetime(2025, 11, 4, 8, 30), date(2025, 11, 4)),
+    ])
+    def test_parse_spanish_date(self, value, expected):
+        assert parse_spanish_date(value, reference=TEST_MONDAY_ISO) == expected
+
+    def test_year_boundary(self):
+        # a schedule published in late December for the first days of January
+        assert parse_spanish_date('viernes 01 de enero', reference=date(2026, 12, 28)) == date(2027, 1, 1)
+        # a schedule read in early January that still covers the end of December
+        assert parse_spanish_date('lunes 29 de diciembre', reference=date(2026, 1, 2)) == date(2025, 12, 29)
+        # the weekday breaks the tie when the year is ambiguous
+        assert parse_spanish_date('domingo 01 de julio', reference=date(2018, 12, 31)) == date(2018, 7, 1)
+        assert parse_spanish_date('lunes 01 de julio', reference=date(2018, 12, 31)) == date(2019, 7, 1)
+
+    @pytest.mark.parametrize('value, reference, expected', [
+        # 2025-11-04 is a martes, and 2024-11-04 a lunes
+        ('lunes 04 de noviembre', date(2025, 11, 3), date(2025, 11, 4)),
+        ('domingo 15 de septiembre', date(2025, 9, 15), date(2025, 9, 15)),
+        ('jueves 02 de enero', date(2025, 12, 29), date(2026, 1, 2)),
+    ])
+    def test_mismatched_weekday(self, value, reference, expected):
+        # a wrong weekday must not move the date to another year
+        assert parse_spanish_date(value, reference=reference) == expected
+
+    @pytest.mark.parametrize('value', ['Date not available.', '31 de febrero 2025', 'lunes 03 de brumario', '', None,
+                                       float('nan'), float('inf'), float('-inf'), 12, 10**400])
+    def test_invalid_dates(self, value):
+        assert parse_spanish_date(value, reference=TEST_MONDAY_ISO) is None
+
+    def test_invalid_dates_are_logged(self, capsys):
+        parse_spanish_date('lunes 03 de brumario', reference=TEST_MONDAY_ISO)
+        assert "'lunes 03 de brumario'" in capsys.readouterr().out
+        # a missing value is not an error
+        parse_spanish_date(None)
+        assert not capsys.readouterr().out
+
+    def test_tables(self):
+        assert len(WEEKDAYS) == 7
+        assert len(MONTHS) == 12
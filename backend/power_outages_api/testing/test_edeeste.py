@@ -1,7 +1,11 @@
 from ..edeeste import Edeeste, ScrapeError
+from ..dates import format_spanish_date
+from ..records import OutageRecord, TimeSlot
 from datetime import timedelta, date
 from .test_data import WEEKDAYS, MONTHS, TEST_MONDAY, DATA
-import pytest, os, re, locale
+import pytest, os, re
+from bs4 import BeautifulSoup
+from PIL import Image, ImageDraw
 
 @pytest.fixture(scope='function')
 def edeeste():
@@ -9,12 +13,7 @@ def edeeste():
 
 @pytest.fixture(scope='function')
 def file(edeeste):
-    temp_file = edeeste._download_file(monday=TEST_MONDAY)
-    
-    yield temp_file
-    
-    if os.path.exists(temp_file):
-        os.remove(temp_file)
+    return edeeste._download_file(monday=TEST_MONDAY)
 
 class TestEdeeste:
     def test_get_monday(self, edeeste):
@@ -25,11 +24,25 @@ class TestEdeeste:
         assert int(data[1]) in range(1, 31)
         assert data[3] in MONTHS
     
+    def test_document_link(self):
+        posts = lambda *mondays: BeautifulSoup(''.join(
+            f'<div class="media"><a>Programa de mantenimiento {format_spanish_date(monday)}</a>'
+            f'<a data-downloadurl="/semana-{monday.isoformat()}.pdf">Descargar</a></div>' for monday in mondays), 'lxml')
+        today = date.today()
+        monday = today - timedelta(days=today.weekday())
+        
+        # the post of the next week does not change the link of the current one
+        assert Edeeste.document_link(posts(monday + timedelta(days=7), monday)) == f'/semana-{monday.isoformat()}.pdf'
+        assert Edeeste.document_link(posts(monday + timedelta(days=7))) is None
+        assert Edeeste.document_link(BeautifulSoup('<p>Mantenimiento</p>', 'lxml')) is None
+        # the week is listed, but without its download button
+        missing = f'<div class="media"><a>Programa de mantenimiento {format_spanish_date(monday)}</a></div>'
+        assert Edeeste.document_link(BeautifulSoup(missing, 'lxml')) is None
+    
     def test_get_download_link(self, edeeste):
-        locale.setlocale(locale.LC_TIME, 'es_ES.UTF-8')
         today = date.today()
         monday = (today - timedelta(days=today.weekday()))
-        unavailable_monday = (monday + timedelta(days=7)).strftime('%A %d de %B')
+        unavailable_monday = format_spanish_date(monday + timedelta(days=7))
         download_link = edeeste._get_download_link(monday=TEST_MONDAY)
         with pytest.raises(ScrapeError) as excinfo:
             download_link = edeeste._get_download_link(monday=unavailable_monday)
@@ -39,12 +52,13 @@ class TestEdeeste:
         assert isinstance(download_link, str)
     
     def test_download_file(self, file):
-        assert os.path.exists(file)
-        assert os.path.splitext(file)[1] == '.pdf'
-        assert os.path.isfile(file)
+        assert file.tell() == 0
+        assert file.getbuffer()[:5] == b'%PDF-'
+        assert not os.path.exists('temp.pdf')
     
     def test_extract_from_pdf(self, file, edeeste):
-        resp = edeeste._extract_from_pdf(path=file).split('\n')
+        resp = edeeste._extract_from_pdf(file=file).split('\n')
+        assert edeeste.usage[-1].prompt_tokens > 0
         header = resp[0].split(',')
         assert header[0] == 'province'
         assert header[1] == 'day'
@@ -63,24 +77,27 @@ class TestEdeeste:
             assert re.match(time_pattern, times[0].strip())
             assert re.match(time_pattern, times[1].strip())
     
+    def test_shape_page(self):
+        page = Image.new('RGB', (2200, 1700), 'white')
+        ImageDraw.Draw(page).rectangle((200, 150, 2000, 1500), fill='black')
+        shaped = Edeeste._shape_page(page)
+        
+        assert shaped.mode == 'L'
+        assert max(shaped.size) == Edeeste.max_page_side
+        # the blank margins are cropped, so the table keeps its aspect ratio
+        assert shaped.size[0] / shaped.size[1] == pytest.approx(1801 / 1351, rel=0.01)
+    
     def test_organize_data(self, edeeste):
         outages = edeeste._organize_data(data=DATA)
         
         assert outages
         assert isinstance(outages, list)
         for outage in outages:
-            assert isinstance(outage, dict)
-            for k, v in outage.items():
-                assert k in {'company', 'week_number', 'day', 'province','maintenance'}
-                if k == 'company':
-                    assert v in {'Edeeste', 'Edesur', 'Edenorte'}
-                elif k == 'week_number':
-                    assert v.isdigit()
-                elif k == 'maintenance':
-                    assert isinstance(v, list)
-                    for event in v:
-                        assert isinstance(event, dict)
-                        for k2, v2 in event.items():
-                            assert k2 in {'time', 'sectors'}
-                            if k2 == 'sectors':
-                                assert isinstance(v2, list)
\ No newline at end of file
+            assert isinstance(outage, OutageRecord)
+            assert outage.company in {'Edeeste', 'Edesur', 'Edenorte'}
+            assert isinstance(outage.week_number, int)
+            assert isinstance(outage.maintenance, list)
+            for event in outage.maintenance:
+                assert isinstance(event, TimeSlot)
+                assert isinstance(event.time, str)
+                assert isinstance(event.sectors, list)
\ No newline at end of file
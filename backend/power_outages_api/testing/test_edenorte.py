@@ -1,8 +1,11 @@
 import re
 from .test_data import TEST_MONDAY_ISO, MONTHS, DATA, WEEKDAYS
 from ..edenorte import Edenorte, ScrapeError
+from ..records import OutageRecord, TimeSlot
+from ..dates import MONTHS as SPANISH_MONTHS
 from datetime import date, timedelta
-import pytest, locale
+from bs4 import BeautifulSoup
+import pytest, pandas as pd
 
 @pytest.fixture(scope='function')
 def edenorte():
@@ -14,7 +17,6 @@ class TestEdenorte:
         assert data == date.today() - timedelta(days=date.today().weekday())
         
     def test_get_link(self, edenorte):
-        locale.setlocale(locale.LC_TIME, 'es_ES.UTF-8')
         today = date.today()
         monday = (today - timedelta(days=today.weekday()))
         unavailable_monday = monday + timedelta(days=7)
@@ -27,8 +29,20 @@ class TestEdenorte:
         assert good_link
         assert isinstance(good_link, str)
     
+    def test_document_link(self):
+        posts = lambda *mondays: BeautifulSoup(''.join(
+            f'<a href="/semana-{monday.isoformat()}">Mantenimientos del {monday.day:02d} de {SPANISH_MONTHS[monday.month - 1]}</a>'
+            for monday in mondays), 'lxml')
+        monday = Edenorte.get_monday()
+        
+        # the post of the next week does not change the link of the current one
+        assert Edenorte.document_link(posts(monday)) == f'/semana-{monday.isoformat()}'
+        assert Edenorte.document_link(posts(monday + timedelta(days=7), monday)) == f'/semana-{monday.isoformat()}'
+        assert Edenorte.document_link(posts(monday + timedelta(days=7))) is None
+    
     def test_extract_from_csv(self, edenorte):
         resp = edenorte._extract_from_csv(monday=TEST_MONDAY_ISO).split('\n')
+        assert edenorte.usage[-1].prompt_tokens > 0
         header = resp[0].split(',')
         assert header[0] == 'province'
         assert header[1] == 'day'
@@ -50,24 +64,41 @@ class TestEdenorte:
             assert re.match(time_pattern, times[0].strip())
             assert re.match(time_pattern, times[1].strip())
             
+    def test_shape_sheet(self):
+        df = pd.DataFrame([
+            ['Programa de Mantenimiento', None, None, None, None],
+            ['Fecha', 'Provincia', 'Circuito', 'Horario', 'Sectores'],
+            ['2025-11-03', 'Santiago', 'CUT-101', '8:00 a.m. - 12:00 p.m.', 'Gurabo, Cienfuegos'],
+            ['2025-11-03', 'Santiago', 'CUT-101', '8:00 a.m. - 12:00 p.m.', 'Gurabo, Cienfuegos'],
+            [None, None, None, None, None]
+        ])
+        shaped = Edenorte._shape_sheet(df)
+        
+        assert list(shaped.columns) == ['Fecha', 'Provincia', 'Horario', 'Sectores']
+        assert len(shaped) == 1
+
+    @pytest.mark.parametrize('sectors, kept', [
+        ('Barrios', ['Fecha', 'Provincia', 'Horario', 'Barrios']),
+        ('Localidades', ['Fecha', 'Provincia', 'Horario', 'Localidades']),
+        # without a recognizable sector column, nothing is dropped
+        ('Circuito', ['Fecha', 'Provincia', 'Horario', 'Circuito', 'Observaciones']),
+    ])
+    def test_shape_sheet_keeps_sectors(self, sectors, kept):
+        df = pd.DataFrame([['2025-11-03', 'Santiago', '8:00 a.m. - 12:00 p.m.', 'Gurabo, Cienfuegos', 'n/a']],
+                          columns=['Fecha', 'Provincia', 'Horario', sectors, 'Observaciones'])
+        assert list(Edenorte._shape_sheet(df).columns) == kept
+            
     def test_organize_data(self, edenorte):
         outages = edenorte._organize_data(data=DATA)
         
         assert outages
         assert isinstance(outages, list)
         for outage in outages:
-            assert isinstance(outage, dict)
-            for k, v in outage.items():
-                assert k in {'company', 'week_number', 'day', 'province','maintenance'}
-                if k == 'company':
-                    assert v in {'Edeeste', 'Edesur', 'Edenorte'}
-                elif k == 'week_number':
-                    assert v.isdigit()
-                elif k == 'maintenance':
-                    assert isinstance(v, list)
-                    for event in v:
-                        assert isinstance(event, dict)
-                        for k2, v2 in event.items():
-                            assert k2 in {'time', 'sectors'}
-                            if k2 == 'sectors':
-                                assert isinstance(v2, list)
\ No newline at end of file
+            assert isinstance(outage, OutageRecord)
+            assert outage.company in {'Edeeste', 'Edesur', 'Edenorte'}
+            assert isinstance(outage.week_number, int)
+            assert isinstance(outage.maintenance, list)
+            for event in outage.maintenance:
+                assert isinstance(event, TimeSlot)
+                assert isinstance(event.time, str)
+                assert isinstance(event.sectors, list)
\ No newline at end of file
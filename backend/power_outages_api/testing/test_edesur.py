@@ -1,4 +1,5 @@
 from ..edesur import Edesur
+from ..records import OutageRecord, TimeSlot
 
 class TestEdesur:
     def test_organize_data(self):
@@ -8,18 +9,11 @@ class TestEdesur:
         assert outages
         assert isinstance(outages, list)
         for outage in outages:
-            assert isinstance(outage, dict)
-            for k, v in outage.items():
-                assert k in {'company', 'week_number', 'day', 'province','maintenance'}
-                if k == 'company':
-                    assert v in {'Edeeste', 'Edesur', 'Edenorte'}
-                elif k == 'week_number':
-                    assert v.isdigit()
-                elif k == 'maintenance':
-                    assert isinstance(v, list)
-                    for event in v:
-                        assert isinstance(event, dict)
-                        for k2, v2 in event.items():
-                            assert k2 in {'time', 'sectors'}
-                            if k2 == 'sectors':
-                                assert isinstance(v2, list)
\ No newline at end of file
+            assert isinstance(outage, OutageRecord)
+            assert outage.company in {'Edeeste', 'Edesur', 'Edenorte'}
+            assert isinstance(outage.week_number, int)
+            assert isinstance(outage.maintenance, list)
+            for event in outage.maintenance:
+                assert isinstance(event, TimeSlot)
+                assert isinstance(event.time, str)
+                assert isinstance(event.sectors, list)
\ No newline at end of file
@@ -0,0 +1,87 @@
+import socket, threading, time, pytest
+from ..electric_providers import ElectricProvider
+
+class Local(ElectricProvider):
+    request_timeout = (1, 1)
+    max_download_bytes = 16
+
+class LocalLinked(Local):
+    @classmethod
+    def document_link(cls, soup):
+        tag = soup.find('a', class_='current')
+        return tag['href'] if tag else None
+
+# the test providers must not be scheduled or listed by the api
+ElectricProvider.registry.pop('Local')
+ElectricProvider.registry.pop('LocalLinked')
+
+def serve(response: bytes, stall: float = 0) -> str:
+    '''
+    Answers a single request with the raw response, then keeps the connection open for `stall` seconds
+    Returns the url of the server
+    '''
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+    
+    def handle():
+        conn, _ = server.accept()
+        conn.recv(4096)
+        conn.sendall(response)
+        time.sleep(stall)
+        conn.close()
+        server.close()
+    
+    threading.Thread(target=handle, daemon=True).start()
+    return f'http://127.0.0.1:{server.getsockname()[1]}/'
+
+def page(body: str, headers: str = '') -> bytes:
+    content = f'<html><body>{body}<script>var nonce = "{time.time()}";</script></body></html>'.encode()
+    return f'HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nContent-Length: {len(content)}\r\n{headers}Connection: close\r\n\r\n'.encode() + content
+
+class TestCheckForUpdate:
+    def test_not_modified(self, monkeypatch):
+        monkeypatch.setattr(Local, 'url', serve(b'HTTP/1.1 304 Not Modified\r\nConnection: close\r\n\r\n'))
+        assert Local.check_for_update({'etag': '"a"'}) is None
+
+    def test_fingerprint(self, monkeypatch):
+        monkeypatch.setattr(Local, 'url', serve(page('<p>Semana del 3 de noviembre</p>', 'ETag: "a"\r\n')))
+        validators = Local.check_for_update()
+        assert validators['etag'] == '"a"'
+        
+        # the scripts change on every request, but the visible text does not
+        monkeypatch.setattr(Local, 'url', serve(page('<p>Semana del 3 de noviembre</p>')))
+        assert Local.check_for_update(validators) is None
+        
+        monkeypatch.setattr(Local, 'url', serve(page('<p>Semana del 10 de noviembre</p>')))
+        assert Local.check_for_update(validators)['fingerprint'] != validators['fingerprint']
+
+    def test_document_link(self, monkeypatch):
+        current = '<a class="current" href="/semana-3.pdf">Semana del 3 de noviembre</a>'
+        monkeypatch.setattr(LocalLinked, 'url', serve(page(current)))
+        validators = LocalLinked.check_for_update()
+        
+        # the schedule of the next week is posted, but the document of the current week is the same
+        monkeypatch.setattr(LocalLinked, 'url', serve(page(current + '<a href="/semana-10.pdf">Semana del 10 de noviembre</a>')))
+        assert LocalLinked.check_for_update(validators) is None
+        
+        monkeypatch.setattr(LocalLinked, 'url', serve(page(current.replace('semana-3', 'semana-3-v2'))))
+        assert LocalLinked.check_for_update(validators) is not None
+
+class TestDownload:
+    def test_download(self):
+        url = serve(b'HTTP/1.1 200 OK\r\nContent-Length: 5\r\nConnection: close\r\n\r\nhello')
+        assert Local.download(url).read() == b'hello'
+
+    def test_stalled_server(self):
+        # the server promises 100 bytes but stops sending
+        url = serve(b'HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\nabc', stall=5)
+        start = time.perf_counter()
+        with pytest.raises(Exception, match='Error downloading file'):
+            Local.download(url)
+        assert time.perf_counter() - start < 4
+
+    def test_size_limit(self):
+        url = serve(b'HTTP/1.1 200 OK\r\nContent-Length: 17\r\nConnection: close\r\n\r\n' + b'x' * 17)
+        with pytest.raises(Exception, match='larger than 16 bytes'):
+            Local.download(url)
@@ -0,0 +1,77 @@
+import asyncio, threading
+from ..events import Broadcaster
+
+class TestBroadcaster:
+    def test_publish_wakes_waiters(self):
+        async def run():
+            broadcaster = Broadcaster()
+            waiters = [asyncio.create_task(broadcaster.wait(0, timeout=5)) for _ in range(3)]
+            await asyncio.sleep(0)
+            broadcaster.publish(2)
+            return await asyncio.gather(*waiters)
+        
+        assert asyncio.run(run()) == [2, 2, 2]
+
+    def test_wait_timeout(self):
+        async def run():
+            broadcaster = Broadcaster()
+            broadcaster.publish(3)
+            # a subscriber that is already up to date only returns after the timeout
+            return await broadcaster.wait(3, timeout=0.01)
+        
+        assert asyncio.run(run()) == 3
+
+    def test_older_versions_are_ignored(self):
+        async def run():
+            broadcaster = Broadcaster()
+            broadcaster.publish(5)
+            broadcaster.publish(4)
+            # a subscriber that is behind returns right away
+            return broadcaster.version, await broadcaster.wait(1, timeout=5)
+        
+        assert asyncio.run(run()) == (5, 5)
+
+    def test_shared_delta(self):
+        calls = []
+        release = threading.Event()
+        
+        def load(since, until):
+            calls.append((since, until))
+            release.wait(5)
+            return f'{since}-{until}'
+        
+        async def run():
+            broadcaster = Broadcaster()
+            broadcaster.publish(2)
+            subscribers = [asyncio.create_task(broadcaster.delta(1, 2, load)) for _ in range(50)]
+            await asyncio.sleep(0.05)
+            release.set()
+            results = await asyncio.gather(*subscribers)
+            # a newer version drops the deltas nobody will ask for anymore
+            broadcaster.publish(3)
+            return results, len(broadcaster._deltas)
+        
+        results, pending = asyncio.run(run())
+        assert set(results) == {'1-2'}
+        assert calls == [(1, 2)]
+        assert pending == 0
+
+    def test_failed_delta_is_retried(self):
+        attempts = []
+        
+        def load(since, until):
+            attempts.append(since)
+            if len(attempts) == 1:
+                raise RuntimeError('database unavailable')
+            return 'ok'
+        
+        async def run():
+            broadcaster = Broadcaster()
+            try:
+                await broadcaster.delta(0, 1, load)
+            except RuntimeError:
+                pass
+            return await broadcaster.delta(0, 1, load)
+        
+        assert asyncio.run(run()) == 'ok'
+        assert len(attempts) == 2
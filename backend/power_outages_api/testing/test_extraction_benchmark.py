@@ -0,0 +1,14 @@
+from ..extraction_benchmark import score
+from ..records import OutageRecord, TimeSlot
+
+def record(*sectors):
+    return OutageRecord('Edeeste', 45, '2025-11-03', 'Santo Domingo', [TimeSlot('9:00 a.m. - 3:00 p.m.', list(sectors))])
+
+class TestExtractionBenchmark:
+    def test_score(self):
+        expected = [record('Boreal', 'La Ureña', 'Los Tres Brazos', 'Riviera Del Ozama')]
+        assert score(expected, expected) == {'precision': 1.0, 'recall': 1.0}
+        # case differences are not counted as mistakes
+        assert score(expected, [record('boreal', 'la ureña', 'Los Tres Brazos', 'Riviera del Ozama')])['recall'] == 1.0
+        assert score(expected, [record('Boreal', 'Villa Duarte')]) == {'precision': 0.5, 'recall': 0.25}
+        assert score(expected, []) == {'precision': 0.0, 'recall': 0.0}
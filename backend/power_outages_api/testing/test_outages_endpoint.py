@@ -1,11 +1,14 @@
-import os, pytest
+import os, pytest, uuid
 from .test_data import DB_DATA
-from ..models import MaintenanceEvent, TimeSectors
-from ..routes import router
+from ..models import MaintenanceEvent, TimeSectors, DataVersion
+from .. import routes, utils
+from ..routes import router, _find_week
+from ..utils import create_models, current_version
+from ..records import OutageRecord, TimeSlot
 from fastapi.testclient import TestClient
 from fastapi import FastAPI
-from sqlmodel import create_engine, Session, SQLModel, select
-from datetime import date
+from sqlmodel import create_engine, Session, SQLModel, select, delete
+from datetime import date, timedelta
 
 DB_URL = os.getenv('DATABASE_URL')
 engine = create_engine(DB_URL)
@@ -14,6 +17,19 @@ app = FastAPI()
 app.include_router(router)
 client = TestClient(app)
 
+# a week far from the fixture data, so the fallback only ever finds the rows of these tests
+LAST_DAY = date(2099, 6, 10)
+TODAY = date(2099, 6, 22)
+
+class FakeDate(date):
+    @classmethod
+    def today(cls):
+        return TODAY
+
+def last_week_event() -> MaintenanceEvent:
+    return MaintenanceEvent(week_number=LAST_DAY.isocalendar()[1], company='Prueba', day=LAST_DAY.isoformat(), province='Azua',
+                            maintenance=[TimeSectors(time='9:00 a.m. - 3:00 p.m.', sectors=['Los Mina'])])
+
 @pytest.fixture(scope="module")
 def session():
     outage_objects = []
@@ -43,6 +59,19 @@ def session():
             db.delete(o)
         db.commit()
         
+@pytest.fixture
+def cleanup():
+    '''
+    Deletes the events of the test provider, and the versions recorded by the test, so no test depends on the order they run in
+    '''
+    with Session(engine) as db:
+        since = current_version(db)
+    yield
+    with Session(engine) as db:
+        db.exec(delete(MaintenanceEvent).where(MaintenanceEvent.company == 'Prueba'))
+        db.exec(delete(DataVersion).where(DataVersion.version > since))
+        db.commit()
+
 class TestOutagesEndpoint:
     def test_outages(self, session):
         resp = client.get('/outages/')
@@ -64,4 +93,120 @@ class TestOutagesEndpoint:
                         for k2, v2 in event.items():
                             assert k2 in {'time', 'sectors'}
                             if k2 == 'sectors':
-                                assert isinstance(v2, list)
\ No newline at end of file
+                                assert isinstance(v2, list)
+    def test_outages_filters(self, session, cleanup):
+        # an event of the current week, so the filters run against the week that is served
+        sector = f'Sector {uuid.uuid4().hex}'
+        create_models([OutageRecord('Prueba', date.today().isocalendar()[1], date.today().isoformat(), 'Azua',
+                                    [TimeSlot('9:00 a.m. - 3:00 p.m.', [sector, 'Los Mina'])])])
+        
+        resp = client.get('/outages/', params={'province': 'AZUA', 'company': 'prueba'})
+        assert resp.status_code == 200
+        events = resp.json()
+        assert events
+        assert all(event['province'] == 'Azua' and event['company'] == 'Prueba' for event in events)
+        
+        resp = client.get('/outages/', params={'sector': sector})
+        assert resp.status_code == 200
+        events = resp.json()
+        assert [event['company'] for event in events] == ['Prueba']
+        assert all(sector in block['sectors'] for event in events for block in event['maintenance'])
+        
+        # the empty result is cached as well, and still answered with a 404
+        for _ in range(2):
+            resp = client.get('/outages/', params={'province': 'Provincia Inexistente'})
+            assert resp.status_code == 404
+
+    def test_changes(self, session, cleanup, monkeypatch):
+        with Session(engine) as db:
+            since = current_version(db)
+        # a refresh with a sector that has never been stored always records a new version
+        sector = f'Sector {uuid.uuid4().hex}'
+        create_models([OutageRecord('Prueba', date.today().isocalendar()[1], date.today().isoformat(), 'Azua',
+                                    [TimeSlot('9:00 a.m. - 3:00 p.m.', [sector])])])
+        
+        resp = client.get('/outages/changes', params={'since': since})
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data['version'] > since
+        changed = data['added'] + data['modified']
+        assert any(sector in block['sectors'] for event in changed for block in event['maintenance'])
+        
+        resp = client.get('/outages/changes', params={'since': data['version']})
+        assert resp.status_code == 204
+        assert not resp.content
+        
+        # the whole history is never replayed
+        assert client.get('/outages/changes').status_code == 422
+        monkeypatch.setattr(utils, 'KEPT_VERSIONS', 0)
+        assert client.get('/outages/changes', params={'since': since}).status_code == 410
+
+    def test_active(self, session, cleanup):
+        create_models([OutageRecord('Prueba', date.today().isocalendar()[1], '2025-11-03', 'Azua', [
+            TimeSlot('9:00 a.m. - 3:00 p.m.', ['Los Mina']),
+            TimeSlot('10:00 p.m. - 2:00 a.m.', ['Villa Duarte'])
+        ])])
+        
+        resp = client.get('/outages/active', params={'at': '2025-11-03T10:00:00'})
+        assert resp.status_code == 200
+        active = [outage for outage in resp.json() if outage['company'] == 'Prueba']
+        assert len(active) == 1
+        assert active[0]['maintenance'] == [{'time': '9:00 a.m. - 3:00 p.m.', 'sectors': ['Los Mina']}]
+        
+        # the second block runs past midnight
+        resp = client.get('/outages/active', params={'at': '2025-11-04T01:30:00-04:00'})
+        active = [outage for outage in resp.json() if outage['company'] == 'Prueba']
+        assert [block['sectors'] for block in active[0]['maintenance']] == [['Villa Duarte']]
+        
+        # the end of a block is exclusive
+        resp = client.get('/outages/active', params={'at': '2025-11-03T19:00:00Z'})
+        assert not [outage for outage in resp.json() if outage['company'] == 'Prueba']
+
+    @pytest.mark.parametrize('path, media_type, first_line', [
+        ('/outages/feed.ics', 'text/calendar', 'BEGIN:VCALENDAR'),
+        ('/outages/feed.csv', 'text/csv', 'company,province,day,time,starts_at,ends_at,sectors'),
+    ])
+    def test_feeds(self, session, path, media_type, first_line):
+        resp = client.get(path)
+        assert resp.status_code == 200
+        assert resp.headers['content-type'].startswith(media_type)
+        assert resp.text.splitlines()[0] == first_line
+        etag = resp.headers['etag']
+        
+        resp = client.get(path, headers={'If-None-Match': etag})
+        assert resp.status_code == 304
+        assert not resp.content
+        
+        # an empty feed is still a valid file
+        resp = client.get(path, params={'province': 'Provincia Inexistente'})
+        assert resp.status_code == 200
+        assert resp.headers['etag'] != etag
+
+class TestServedWeek:
+    def test_find_week(self):
+        with Session(engine) as db:
+            db.add(last_week_event())
+            db.flush()
+            # the week of the event is served as is
+            assert _find_week(db, LAST_DAY + timedelta(days=2)) == (LAST_DAY.isocalendar()[1], 2099, False)
+            # a week without events falls back to the last one that has them
+            assert _find_week(db, TODAY) == (LAST_DAY.isocalendar()[1], 2099, True)
+            db.rollback()
+
+    def test_stale_header(self, monkeypatch):
+        with Session(engine) as db:
+            event = last_week_event()
+            db.add(event)
+            db.commit()
+            event_id = event.id
+        try:
+            monkeypatch.setattr(routes, 'date', FakeDate)
+            resp = client.get('/outages/', params={'company': 'Prueba'})
+            assert resp.status_code == 200
+            assert resp.headers['x-data-stale'] == 'true'
+            assert resp.headers['x-data-week'] == f'2099-W{LAST_DAY.isocalendar()[1]:02d}'
+            assert [event['day'] for event in resp.json()] == [LAST_DAY.isoformat()]
+        finally:
+            with Session(engine) as db:
+                db.delete(db.get(MaintenanceEvent, event_id))
+                db.commit()
@@ -0,0 +1,66 @@
+import os, re, uuid, pytest
+from datetime import date
+from .. import profiling
+from ..models import MaintenanceEvent, DataVersion
+from ..records import OutageRecord, TimeSlot
+from ..utils import create_models, current_version
+from ..db import engine
+from sqlmodel import Session, delete
+from ..profiling import ProfilingMiddleware, RequestProfile, span, mark
+from ..routes import router
+from fastapi.testclient import TestClient
+from fastapi import FastAPI
+
+app = FastAPI()
+app.include_router(router)
+app.add_middleware(ProfilingMiddleware)
+client = TestClient(app)
+SECTOR = f'Sector {uuid.uuid4().hex}'
+
+@pytest.fixture
+def seeded():
+    '''
+    Stores an event of the current week with a sector no request has seen, so the profiled request misses the cache and queries the database
+    '''
+    with Session(engine) as db:
+        since = current_version(db)
+    create_models([OutageRecord('Prueba', date.today().isocalendar()[1], date.today().isoformat(), 'Azua',
+                                [TimeSlot('9:00 a.m. - 3:00 p.m.', [SECTOR])])])
+    yield
+    with Session(engine) as db:
+        db.exec(delete(MaintenanceEvent).where(MaintenanceEvent.company == 'Prueba'))
+        db.exec(delete(DataVersion).where(DataVersion.version > since))
+        db.commit()
+
+class TestProfiling:
+    def test_server_timing(self):
+        profile = RequestProfile(sql_count=3, sql_seconds=0.0125, spans={'query': 0.02})
+        profile.marks['cache'] = 'miss'
+        header = profile.server_timing(0.05, 1024)
+        assert header == ('sql;dur=12.50;desc="3 statements", query;dur=20.00, cache;desc="miss", '
+                          'payload;desc="1024 bytes", total;dur=50.00')
+
+    def test_disabled_by_default(self):
+        # spans and marks are no-ops outside of a profiled request
+        with span('query'):
+            mark('cache', 'hit')
+        resp = client.get('/outages/providers')
+        assert 'server-timing' not in resp.headers
+
+    def test_opt_in_header(self, monkeypatch, tmp_path, seeded):
+        monkeypatch.setattr(profiling, 'PROFILE_TOKEN', 'token')
+        monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path))
+        monkeypatch.setattr(profiling, 'PROFILE_SAMPLE_RATE', 1.0)
+        
+        resp = client.get('/outages/', params={'company': 'Prueba'}, headers={'X-Profile': 'wrong'})
+        assert 'server-timing' not in resp.headers
+        
+        resp = client.get('/outages/', params={'sector': SECTOR}, headers={'X-Profile': 'token'})
+        assert resp.status_code == 200
+        metrics = resp.headers['server-timing'].split(', ')
+        names = [metric.split(';')[0] for metric in metrics]
+        assert names == ['sql', 'query', 'serialize', 'cache', 'payload', 'total']
+        assert int(re.search(r'desc="(\d+) statements"', metrics[0]).group(1)) > 0
+        assert metrics[3] == 'cache;desc="miss"'
+        assert metrics[4] == f'payload;desc="{len(resp.content)} bytes"'
+        assert any(name.endswith('.prof') for name in os.listdir(tmp_path))
@@ -0,0 +1,72 @@
+from ..records import OutageRecord, TimeSlot, parse_time_range, parse_clock
+from datetime import time
+import pytest
+
+class TestRecords:
+    def test_time_slot(self):
+        slot = TimeSlot('  9:00 a.m. - 3:00 p.m. ', [' Los Mina ', '', '  ', 'Villa Duarte'])
+        assert slot.time == '9:00 a.m. - 3:00 p.m.'
+        assert slot.sectors == ['Los Mina', 'Villa Duarte']
+        assert (slot.start, slot.end) == (time(9), time(15))
+        assert slot.to_dict() == {'time': '9:00 a.m. - 3:00 p.m.', 'sectors': ['Los Mina', 'Villa Duarte']}
+
+    def test_missing_time(self):
+        # pandas reads empty cells as NaN
+        slot = TimeSlot(float('nan'), ['Los Mina'])
+        assert slot.time == 'Time data not available.'
+        assert (slot.start, slot.end) == (None, None)
+
+    def test_interning(self):
+        first = OutageRecord('Edesur', '45', ''.join(['2025-', '11-03']), ' Azua ', [TimeSlot('n/a', [''.join(['Los ', 'Mina'])])])
+        second = OutageRecord('Edesur', 45, '2025-11-03', 'Azua', [TimeSlot('n/a', ['Los Mina'])])
+        assert first.week_number == 45
+        assert first.province is second.province
+        assert first.day is second.day
+        assert first.maintenance[0].sectors[0] is second.maintenance[0].sectors[0]
+
+    def test_event_row(self):
+        record = OutageRecord('Edesur', 45, '2025-11-03', 'Azua', [])
+        assert record.event_row() == {'week_number': 45, 'company': 'Edesur', 'day': '2025-11-03', 'province': 'Azua'}
+        assert record.key == (45, 'Edesur', '2025-11-03', 'Azua')
+
+    def test_time_sector_rows(self):
+        record = OutageRecord('Edesur', 45, '2025-11-03', 'Azua', [
+            TimeSlot('9:00 a.m. - 3:00 p.m.', ['Los Mina']),
+            TimeSlot('Time data not available.', ['Villa Duarte'])
+        ])
+        rows = record.time_sector_rows(7)
+        assert [row['maintenance_event_id'] for row in rows] == [7, 7]
+        assert rows[0]['sectors'] == ['Los Mina']
+        assert rows[0]['starts_at'].isoformat() == '2025-11-03T09:00:00-04:00'
+        assert rows[0]['ends_at'].isoformat() == '2025-11-03T15:00:00-04:00'
+        assert (rows[1]['starts_at'], rows[1]['ends_at']) == (None, None)
+        assert record.to_dict()['maintenance'] == [slot.to_dict() for slot in record.maintenance]
+
+    @pytest.mark.parametrize('text, expected', [
+        ('9:20 a.m. - 3:20 p.m.', (time(9, 20), time(15, 20))),
+        ('12:30 a.m. - 12:15 p.m.', (time(0, 30), time(12, 15))),
+        ('10:00 p.m. - 2:00 a.m.', (time(22), time(2))),
+        ('8:00AM - 5:00 PM', (time(8), time(17))),
+        ('Time data not available.', (None, None)),
+        ('9:00 a.m.', (None, None)),
+        ('13:00 p.m. - 2:00 p.m.', (None, None)),
+    ])
+    def test_parse_time_range(self, text, expected):
+        assert parse_time_range(text) == expected
+
+    def test_parse_clock(self):
+        assert parse_clock('12:00 p.m.') == time(12)
+        assert parse_clock('12:05 a.m.') == time(0, 5)
+        assert parse_clock('mediodía') is None
+
+    def test_interval(self):
+        record = OutageRecord('Edesur', 45, '2025-11-03', 'Azua', [
+            TimeSlot('10:00 p.m. - 2:00 a.m.', ['Los Mina']),
+            TimeSlot('9:00 a.m. - 3:00 p.m.', ['Los Mina'])
+        ])
+        # blocks that end before they start run past midnight
+        start, end = record.interval(record.maintenance[0])
+        assert (start.isoformat(), end.isoformat()) == ('2025-11-03T22:00:00-04:00', '2025-11-04T02:00:00-04:00')
+        
+        undated = OutageRecord('Edesur', 45, 'Date not available.', 'Azua', record.maintenance)
+        assert undated.interval(undated.maintenance[1]) == (None, None)
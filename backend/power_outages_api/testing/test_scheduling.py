@@ -0,0 +1,41 @@
+from ..scheduling import PollingTrigger, in_window, next_check, describe
+from ..records import LOCAL_TZ
+from ..edeeste import Edeeste
+from ..edesur import Edesur
+from datetime import datetime, timedelta, timezone
+import pytest
+
+class TestScheduling:
+    @pytest.mark.parametrize('at, expected', [
+        (datetime(2026, 10, 16, 6, 0, tzinfo=LOCAL_TZ), True),      # friday morning
+        (datetime(2026, 10, 19, 21, 59, tzinfo=LOCAL_TZ), True),    # monday night
+        (datetime(2026, 10, 19, 22, 0, tzinfo=LOCAL_TZ), False),
+        (datetime(2026, 10, 14, 12, 0, tzinfo=LOCAL_TZ), False),    # wednesday
+    ])
+    def test_in_window(self, at, expected):
+        assert in_window(Edeeste, at) == expected
+        assert in_window(Edeeste, at.astimezone(timezone.utc)) == expected
+
+    def test_next_check(self):
+        inside = datetime(2026, 10, 16, 10, 0, tzinfo=LOCAL_TZ)
+        assert next_check(Edeeste, inside) == inside + Edeeste.poll_interval
+        
+        outside = datetime(2026, 10, 14, 12, 0, tzinfo=LOCAL_TZ)
+        assert next_check(Edeeste, outside) == outside + Edeeste.idle_interval
+        
+        # backing off never skips the opening of a window
+        night = datetime(2026, 10, 16, 3, 0, tzinfo=LOCAL_TZ)
+        assert next_check(Edeeste, night) == datetime(2026, 10, 16, 6, 0, tzinfo=LOCAL_TZ)
+        assert next_check(Edesur, datetime(2026, 10, 14, 20, 0, tzinfo=LOCAL_TZ)) == datetime(2026, 10, 15, 2, 0, tzinfo=LOCAL_TZ)
+
+    def test_trigger(self):
+        trigger = PollingTrigger(Edeeste)
+        now = datetime(2026, 10, 16, 10, 0, tzinfo=LOCAL_TZ)
+        first = trigger.get_next_fire_time(None, now)
+        assert first > now
+        assert trigger.get_next_fire_time(first, now) - first == timedelta(minutes=30)
+
+    def test_describe(self):
+        schedule = describe(Edeeste)
+        assert schedule['poll_interval_minutes'] < schedule['idle_interval_minutes']
+        assert schedule['publication_windows'][0]['weekdays'] == [4, 5, 6, 0]
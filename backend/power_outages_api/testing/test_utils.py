@@ -0,0 +1,198 @@
+import os, pytest
+from .. import utils
+from ..models import DataVersion
+from ..utils import diff_events, collect_changes, current_version, prune_versions, VersionExpired, upgrade_schema, missing_upgrades, SCHEMA_UPGRADES, save_refresh, provider_status, acquire_slot, _Lease, _Handoff
+from ..models import ProviderRefresh
+from ..electric_providers import ElectricProvider
+from datetime import datetime, timedelta, timezone
+import threading
+from sqlmodel import create_engine, Session, SQLModel, select
+from sqlalchemy import inspect, text
+
+DB_URL = os.getenv('DATABASE_URL')
+engine = create_engine(DB_URL)
+SQLModel.metadata.create_all(engine)
+
+class Prueba(ElectricProvider):
+    pass
+
+# the test provider must not be scheduled or listed by the api
+ElectricProvider.registry.pop('Prueba')
+
+KEY = (45, 'Edesur', '2025-11-03', 'Azua')
+OTHER_KEY = (45, 'Edesur', '2025-11-04', 'Peravia')
+
+def event(key, *sectors):
+    week_number, company, day, province = key
+    return {'week_number': week_number, 'company': company, 'day': day, 'province': province,
+            'maintenance': [{'time': '9:00 a.m. - 3:00 p.m.', 'sectors': list(sectors)}]}
+
+def removal(key):
+    week_number, company, day, province = key
+    return {'week_number': week_number, 'company': company, 'day': day, 'province': province}
+
+def changes_since(*versions):
+    '''
+    Records the versions in a transaction that is rolled back, and returns their merged changes
+    '''
+    with Session(engine) as db:
+        since = current_version(db)
+        for added, modified, removed in versions:
+            db.add(DataVersion(added=added, modified=modified, removed=removed))
+            db.flush()
+        changes = collect_changes(db, since)
+        db.rollback()
+
+    return changes
+
+class TestDiffEvents:
+    def test_diff(self):
+        old = {KEY: [{'time': 'a', 'sectors': ['A']}], OTHER_KEY: [{'time': 'a', 'sectors': ['B']}]}
+        new = {KEY: [{'time': 'a', 'sectors': ['A', 'C']}], (46, 'Edesur', '2025-11-10', 'Azua'): []}
+        changes = diff_events(old, new)
+        assert [e['day'] for e in changes['added']] == ['2025-11-10']
+        assert changes['modified'] == [{**removal(KEY), 'maintenance': [{'time': 'a', 'sectors': ['A', 'C']}]}]
+        assert changes['removed'] == [removal(OTHER_KEY)]
+
+    def test_no_changes(self):
+        same = {KEY: [{'time': 'a', 'sectors': ['A']}]}
+        assert not any(diff_events(same, dict(same)).values())
+
+class TestCollectChanges:
+    def test_nothing_changed(self):
+        assert changes_since() is None
+
+    def test_added_then_removed(self):
+        # the client never saw the event, so it is not reported at all
+        changes = changes_since(([event(KEY, 'A')], [], []), ([], [], [removal(KEY)]))
+        assert (changes.added, changes.modified, changes.removed) == ([], [], [])
+
+    def test_removed_then_added(self):
+        # the client still has the old copy, so it must replace it
+        changes = changes_since(([], [], [removal(KEY)]), ([event(KEY, 'B')], [], []))
+        assert changes.added == [] and changes.removed == []
+        assert [block.sectors for block in changes.modified[0].maintenance] == [['B']]
+
+    def test_modified_after_added(self):
+        # the event is still new to the client, with its latest content
+        changes = changes_since(([event(KEY, 'A')], [], []), ([], [event(KEY, 'B')], []))
+        assert changes.modified == []
+        assert [block.sectors for block in changes.added[0].maintenance] == [['B']]
+
+    def test_modified_then_removed(self):
+        changes = changes_since(([], [event(KEY, 'A')], []), ([], [], [removal(KEY)]), ([event(OTHER_KEY, 'C')], [], []))
+        assert changes.modified == []
+        assert [e.day for e in changes.removed] == [KEY[2]]
+        assert [e.day for e in changes.added] == [OTHER_KEY[2]]
+        assert changes.version > 0
+
+    def test_expired_version(self, monkeypatch):
+        monkeypatch.setattr(utils, 'KEPT_VERSIONS', 1)
+        with Session(engine) as db:
+            since = current_version(db)
+            for _ in range(2):
+                db.add(DataVersion(added=[event(KEY, 'A')]))
+                db.flush()
+            latest = current_version(db)
+            # only the latest version is kept, so a client that missed the one before it must reload
+            with pytest.raises(VersionExpired):
+                collect_changes(db, since)
+            assert collect_changes(db, latest - 1).version == latest
+            
+            prune_versions(db, latest)
+            assert db.exec(select(DataVersion.version).where(DataVersion.version > since)).all() == [latest]
+            db.rollback()
+
+class TestSchemaUpgrades:
+    def test_upgrade_existing_table(self):
+        # Postgres runs DDL in transactions, so the table of the test database is left untouched
+        with engine.connect() as conn:
+            transaction = conn.begin()
+            try:
+                conn.execute(text('ALTER TABLE time_sectors DROP COLUMN starts_at, DROP COLUMN ends_at'))
+                conn.execute(text('DROP INDEX ix_time_sectors_sectors, ix_time_sectors_maintenance_event_id, '
+                                  'ix_maintenance_event_week_province, ix_maintenance_event_week_company'))
+                # dropping the columns also dropped the interval index
+                assert len(missing_upgrades(conn)) == len(SCHEMA_UPGRADES)
+                upgrade_schema(conn)
+                # a second run finds nothing to do
+                assert missing_upgrades(conn) == []
+                columns = {column['name'] for column in inspect(conn).get_columns('time_sectors')}
+                indexes = {index['name'] for table in ('time_sectors', 'maintenance_event')
+                           for index in inspect(conn).get_indexes(table)}
+            finally:
+                transaction.rollback()
+        
+        assert {'starts_at', 'ends_at'} <= columns
+        assert {'ix_time_sectors_interval', 'ix_time_sectors_sectors', 'ix_time_sectors_maintenance_event_id',
+                'ix_maintenance_event_week_province', 'ix_maintenance_event_week_company'} <= indexes
+
+class TestProviderState:
+    def test_lease(self):
+        limit = threading.BoundedSemaphore(1)
+        limit.acquire()
+        lease = _Lease(limit.release)
+        # a scrape thread that outlived its timeout
+        lease.retain()
+        lease.release()
+        assert not limit.acquire(blocking=False)
+        lease.release()
+        assert limit.acquire(blocking=False)
+
+    def test_revoked_handoff(self):
+        limit = threading.BoundedSemaphore(1)
+        limit.acquire()
+        lease = _Lease(limit.release)
+        # the waiter was cancelled before the thread started
+        handoff = _Handoff(lease)
+        handoff.revoke()
+        assert not handoff.claim()
+        lease.release()
+        assert limit.acquire(blocking=False)
+        
+        # once the thread claims the hold, only the thread releases it
+        limit.release()
+        limit.acquire()
+        lease = _Lease(limit.release)
+        handoff = _Handoff(lease)
+        assert handoff.claim()
+        handoff.revoke()
+        lease.release()
+        assert not limit.acquire(blocking=False)
+        handoff.lease.release()
+        assert limit.acquire(blocking=False)
+
+    def test_slots(self):
+        # the slots are shared by every worker, so a second acquisition fails even from another connection
+        lease = acquire_slot(Prueba)
+        try:
+            assert lease is not None
+            assert acquire_slot(Prueba) is None
+        finally:
+            lease.release()
+        lease = acquire_slot(Prueba)
+        assert lease is not None
+        lease.release()
+
+    def test_stored_history(self):
+        try:
+            with Session(engine) as db:
+                assert provider_status(Prueba, db).stale
+            
+            save_refresh(Prueba, last_run=datetime.now(timezone.utc), last_error='Timed out.')
+            save_refresh(Prueba, last_success=datetime.now(timezone.utc), last_error=None, validators={'fingerprint': 'abc'})
+            with Session(engine) as db:
+                status = provider_status(Prueba, db)
+                assert not status.stale
+                assert status.last_error is None
+                assert status.last_run is not None
+                assert db.get(ProviderRefresh, 'Prueba').validators == {'fingerprint': 'abc'}
+            
+            save_refresh(Prueba, last_success=datetime.now(timezone.utc) - Prueba.freshness_sla - timedelta(minutes=1))
+            with Session(engine) as db:
+                assert provider_status(Prueba, db).stale
+        finally:
+            with Session(engine) as db:
+                if row := db.get(ProviderRefresh, 'Prueba'):
+                    db.delete(row)
+                    db.commit()
@@ -1,84 +1,444 @@
-import asyncio
-from .edeeste import Edeeste, ModelError as EdeesteModelError
-from .edesur import Edesur
-from .edenorte import Edenorte, ModelError as EdenorteModelError
-from .models import MaintenanceEvent, TimeSectors
+import asyncio, threading, zlib
+from .electric_providers import ElectricProvider
+from .models import MaintenanceEvent, TimeSectors, DataVersion, OutageChanges, ProviderStatus, ProviderRefresh
+from .records import OutageRecord, LOCAL_TZ
+from .scheduling import describe
 from .db import engine
-from sqlmodel import SQLModel, Session, delete
-from datetime import date
-from sqlalchemy.exc import ProgrammingError
+from sqlmodel import SQLModel, Session, delete, select, func
+from datetime import date, datetime, timezone
+from sqlalchemy.exc import ProgrammingError, SQLAlchemyError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy import insert, text
+from sqlalchemy.orm import selectinload
 
-async def get_outages(company_class, retry):
+# arbitrary key for the advisory lock that serializes refreshes across threads and workers
+REFRESH_LOCK_ID = 7_283_104
+# Postgres channel used to announce new data versions to every web worker
+CHANNEL = 'outages_updates'
+# arbitrary key for the advisory lock that serializes the schema upgrades
+SCHEMA_LOCK_ID = 7_283_105
+# data versions kept for /outages/changes. clients that are further behind reload the data instead
+KEPT_VERSIONS = 500
+# arbitrary first key of the advisory locks that hold the refresh slots of each provider
+PROVIDER_LOCK_SPACE = 7_283_106
+# create_all() only creates missing tables, so the columns and indexes added to existing tables are applied here,
+# keyed by the name of the column or index they create. rows stored before the upgrade get their intervals
+# with the next refresh of their week
+SCHEMA_UPGRADES = (
+    ('starts_at', 'ALTER TABLE time_sectors ADD COLUMN IF NOT EXISTS starts_at TIMESTAMPTZ'),
+    ('ends_at', 'ALTER TABLE time_sectors ADD COLUMN IF NOT EXISTS ends_at TIMESTAMPTZ'),
+    ('ix_time_sectors_interval', 'CREATE INDEX IF NOT EXISTS ix_time_sectors_interval ON time_sectors (starts_at, ends_at)'),
+    ('ix_time_sectors_sectors', 'CREATE INDEX IF NOT EXISTS ix_time_sectors_sectors ON time_sectors USING gin (sectors jsonb_path_ops)'),
+    ('ix_time_sectors_maintenance_event_id',
+     'CREATE INDEX IF NOT EXISTS ix_time_sectors_maintenance_event_id ON time_sectors (maintenance_event_id)'),
+    ('ix_maintenance_event_week_province', 'CREATE INDEX IF NOT EXISTS ix_maintenance_event_week_province ON maintenance_event '
+                                           '(week_number, lower(province)) INCLUDE (id, company, day, province)'),
+    ('ix_maintenance_event_week_company', 'CREATE INDEX IF NOT EXISTS ix_maintenance_event_week_company ON maintenance_event '
+                                          '(week_number, lower(company)) INCLUDE (id, company, day, province)'),
+)
+
+class VersionExpired(Exception):
+    pass
+
+def _slot_key(company_class, slot: int) -> int:
+    '''
+    Returns the second key of the advisory lock of the slot, a signed 32-bit integer that stays the same across processes
+    '''
+    return zlib.crc32(f'{company_class.__name__}:{slot}'.encode()) - 2**31
+
+class _Lease:
+    '''
+    Holds a provider's refresh slot until every holder is done with it. A scrape thread that outlives
+    its timeout cannot be interrupted, so it keeps the slot until it actually finishes
+    '''
+    def __init__(self, on_release):
+        '''
+        on_release: a function that frees the slot, called once the last holder is done
+        '''
+        self.on_release = on_release
+        self.holders = 1
+        self._lock = threading.Lock()
+
+    def retain(self) -> None:
+        with self._lock:
+            self.holders += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self.holders -= 1
+            if self.holders == 0:
+                self.on_release()
+
+class _Handoff:
+    '''
+    A hold on a lease that is passed to a worker thread. The thread claims it when it starts. If the waiter
+    is cancelled before that, the thread never runs, so the waiter revokes the hold and releases it instead
+    '''
+    def __init__(self, lease: _Lease):
+        lease.retain()
+        self.lease = lease
+        self.claimed = None
+        self._lock = threading.Lock()
+
+    def claim(self) -> bool:
+        '''
+        Returns whether the thread now owns the hold, and must release it
+        '''
+        with self._lock:
+            if self.claimed is None:
+                self.claimed = True
+            
+            return self.claimed
+
+    def revoke(self) -> None:
+        with self._lock:
+            revoked = self.claimed is None
+            if revoked:
+                self.claimed = False
+        if revoked:
+            self.lease.release()
+
+def _free_slot(conn) -> None:
+    try:
+        conn.execute(select(func.pg_advisory_unlock_all()))
+        conn.commit()
+        conn.close()
+    except SQLAlchemyError as e:
+        # the locks belong to the session, so dropping the connection frees them too
+        print('Could not free a refresh slot:', e)
+        conn.invalidate()
+
+def acquire_slot(company_class) -> _Lease | None:
+    '''
+    company_class: a registered ElectricProvider subclass
+    Takes one of the provider's max_concurrency refresh slots. Every worker runs its own scheduler, so the slots are
+    advisory locks held by a dedicated connection, and the limit holds across every process
+    Returns the lease of the slot, or None if every slot is taken
+    '''
+    conn = engine.connect()
+    try:
+        for slot in range(company_class.max_concurrency):
+            if conn.execute(select(func.pg_try_advisory_lock(PROVIDER_LOCK_SPACE, _slot_key(company_class, slot)))).scalar():
+                # the lock outlives the transaction, which must not stay open while the provider is scraped
+                conn.commit()
+                return _Lease(lambda: _free_slot(conn))
+    except BaseException:
+        conn.invalidate()
+        raise
+    conn.close()
+    
+    return None
+
+def load_refresh(company_class) -> ProviderRefresh | None:
+    '''
+    company_class: a registered ElectricProvider subclass
+    Returns the stored refresh history of the provider, or None if it has never been refreshed
     '''
-    company: Edeeste, Edesur, or Edenorte class
+    with Session(engine) as session:
+        return session.get(ProviderRefresh, company_class.__name__)
+
+def save_refresh(company_class, **fields) -> None:
+    '''
+    company_class: a registered ElectricProvider subclass
+    fields: the columns of provider_refresh to update
+    Stores the fields. The history is informational, so a database error is logged instead of failing the refresh
+    '''
+    statement = pg_insert(ProviderRefresh).values(name = company_class.__name__, **fields). \
+        on_conflict_do_update(index_elements = ['name'], set_ = fields)
+    try:
+        with Session(engine) as session:
+            session.execute(statement)
+            session.commit()
+    except SQLAlchemyError as e:
+        print(f'Could not store the refresh history of {company_class.__name__}:', e)
+
+def provider_status(company_class, session: Session) -> ProviderStatus:
+    '''
+    company_class: a registered ElectricProvider subclass
+    Returns the schedule and freshness of the provider's data
+    '''
+    refresh = session.get(ProviderRefresh, company_class.__name__) or ProviderRefresh(name = company_class.__name__)
+    stale = not refresh.last_success or datetime.now(timezone.utc) - refresh.last_success > company_class.freshness_sla
+    
+    return ProviderStatus(
+        name = company_class.__name__,
+        schedule = describe(company_class),
+        last_check = refresh.last_check,
+        last_run = refresh.last_run,
+        last_success = refresh.last_success,
+        last_error = refresh.last_error,
+        stale = stale
+    )
+
+def _this_week(moment: datetime | None) -> bool:
+    return bool(moment) and moment.astimezone(LOCAL_TZ).isocalendar()[:2] == datetime.now(LOCAL_TZ).isocalendar()[:2]
+
+def _fetch(company_class, handoff: _Handoff) -> list | None:
+    if not handoff.claim():
+        return None
+    try:
+        company = company_class()
+        
+        return company.scrape()
+    finally:
+        handoff.lease.release()
+
+async def get_outages(company_class, retry, conditional = False):
+    '''
+    company_class: a registered ElectricProvider subclass
+    conditional (optional): only scrape if the provider's listing page changed since the last refresh of the current week
     Fetches the data for the corresponding company and adds it to the database
     returns a co-routine
     '''
-    while True:
-        print(f'Fetching data for {company_class.__name__}...')
+    # taken before any await, so a cancellation cannot lose the lease
+    lease = acquire_slot(company_class)
+    if lease is None:
+        print(f'A refresh for {company_class.__name__} is already running. Skipping.')
+        return
+    
+    try:
+        previous = await asyncio.to_thread(load_refresh, company_class)
+        last_success = previous.last_success if previous else None
+        validators = previous.validators if previous else None
+        
+        # the validators are recorded on every refresh, so the first poll after a full scrape can already skip
+        await asyncio.to_thread(save_refresh, company_class, last_check = datetime.now(timezone.utc))
         try:
-            company = await asyncio.to_thread(company_class)
-            outages = await asyncio.to_thread(company.scrape)
-        except (EdeesteModelError, EdenorteModelError):
-            # ModelError is a server-side error. Keep trying until successful.
-            if retry:
-                print(f'Error fetching data from {company_class.__name__}. Retrying in 30 minutes.')
-                await asyncio.sleep(1800)
-            else:
-                print(f'Error fetching data from {company_class.__name__}.')
-                break
+            checked = await asyncio.to_thread(company_class.check_for_update, validators)
         except Exception as e:
-            print(f'Error fetching data from {company_class.__name__}:', e)
-            break
+            # without a reliable check we fall back to a full scrape
+            print(f'Could not check {company_class.__name__} for updates:', e)
+            validators = None
         else:
-            print(f'Creating models for {company_class.__name__}...')
-            await asyncio.to_thread(create_models, outages)
-            print(f'Models for {company_class.__name__} created successfully!')
-            break
+            if conditional and checked is None and _this_week(last_success):
+                print(f'No updates for {company_class.__name__}. Skipping.')
+                return
+            validators = checked or validators
+        
+        while True:
+            print(f'Fetching data for {company_class.__name__}...')
+            await asyncio.to_thread(save_refresh, company_class, last_run = datetime.now(timezone.utc))
+            handoff = _Handoff(lease)
+            try:
+                # the worker thread cannot be interrupted, but we stop waiting for it
+                outages = await asyncio.wait_for(asyncio.to_thread(_fetch, company_class, handoff), company_class.timeout)
+            except company_class.retryable_errors:
+                await asyncio.to_thread(save_refresh, company_class, last_error = 'AI model not available.')
+                # ModelError is a server-side error. Keep trying until successful.
+                if retry:
+                    print(f'Error fetching data from {company_class.__name__}. Retrying in 30 minutes.')
+                    await asyncio.sleep(1800)
+                else:
+                    print(f'Error fetching data from {company_class.__name__}.')
+                    break
+            except TimeoutError:
+                error = f'Timed out after {company_class.timeout} seconds.'
+                await asyncio.to_thread(save_refresh, company_class, last_error = error)
+                print(f'Error fetching data from {company_class.__name__}:', error)
+                break
+            except Exception as e:
+                await asyncio.to_thread(save_refresh, company_class, last_error = str(e))
+                print(f'Error fetching data from {company_class.__name__}:', e)
+                break
+            else:
+                print(f'Creating models for {company_class.__name__}...')
+                await asyncio.to_thread(create_models, outages)
+                await asyncio.to_thread(save_refresh, company_class, last_success = datetime.now(timezone.utc),
+                                        last_error = None, validators = validators)
+                print(f'Models for {company_class.__name__} created successfully!')
+                break
+            finally:
+                # a no-op if the thread started, which then releases its hold when it is done
+                handoff.revoke()
+    finally:
+        lease.release()
+
+def refresh(company_class) -> None:
+    '''
+    company_class: a registered ElectricProvider subclass
+    Entry point for the scheduler. Each provider runs in its own job, so a slow provider never delays the others.
+    The scheduler polls often, so the full scrape only runs when the provider published something new.
+    The schema is set up once at startup, by the lifespan of the app
+    '''
+    asyncio.run(get_outages(company_class, retry = True, conditional = True))
 
 async def main(retry=True) -> None:
     '''
-    Runs the async function get_outages() with the valid companies concurrently
+    Runs the async function get_outages() with every registered provider concurrently
     '''
-    coros = [get_outages(company, retry) for company in (Edeeste, Edesur, Edenorte)]
+    coros = [get_outages(company, retry) for company in ElectricProvider.registry.values()]
     
     await asyncio.gather(*coros)
 
 def create_db() -> None:
     '''
-    Creates the database
+    Creates the database, and adds the columns and indexes that create_all() cannot add to existing tables
     '''
     SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        upgrade_schema(conn)
+
+def missing_upgrades(conn) -> list:
+    '''
+    conn: a database connection
+    Returns the statements of SCHEMA_UPGRADES whose column or index does not exist yet
+    '''
+    existing = set(conn.execute(text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = 'time_sectors' "
+        "UNION SELECT indexname FROM pg_indexes "
+        "WHERE schemaname = current_schema() AND tablename IN ('time_sectors', 'maintenance_event')"
+    )).scalars())
+    
+    return [statement for name, statement in SCHEMA_UPGRADES if name not in existing]
+
+def upgrade_schema(conn) -> None:
+    '''
+    conn: a connection with an open transaction
+    Applies the missing SCHEMA_UPGRADES. Even with IF NOT EXISTS, ALTER TABLE locks out every reader of the table,
+    so nothing runs when the schema is already up to date. Every worker runs this at startup, so the upgrades
+    are serialized with an advisory lock
+    '''
+    if not missing_upgrades(conn):
+        return
+    conn.execute(select(func.pg_advisory_xact_lock(SCHEMA_LOCK_ID)))
+    # another worker may have applied them while we waited for the lock
+    for statement in missing_upgrades(conn):
+        conn.execute(text(statement))
+
+def event_key(event: dict) -> tuple:
+    '''
+    event: a dictionary representation of a maintenance event
+    Returns the tuple that identifies the event across refreshes
+    '''
+    return (int(event['week_number']), event['company'], str(event['day']), event['province'])
+
+def _key_to_dict(key: tuple) -> dict:
+    return dict(zip(('week_number', 'company', 'day', 'province'), key))
+
+def _group_events(records) -> dict:
+    '''
+    records: an iterable of OutageRecord objects
+    Returns a dictionary mapping each event key to its merged maintenance list
+    '''
+    grouped = {}
+    for record in records:
+        grouped.setdefault(record.key, []).extend(slot.to_dict() for slot in record.maintenance)
+    
+    return grouped
+
+def diff_events(old: dict, new: dict) -> dict:
+    '''
+    old, new: dictionaries mapping event keys to maintenance lists, as returned by _group_events()
+    Returns a dictionary with the added, modified, and removed events
+    '''
+    added = [{**_key_to_dict(k), 'maintenance': v} for k, v in new.items() if k not in old]
+    modified = [{**_key_to_dict(k), 'maintenance': v} for k, v in new.items() if k in old and old[k] != v]
+    removed = [_key_to_dict(k) for k in old if k not in new]
+    
+    return {'added': added, 'modified': modified, 'removed': removed}
+
+def current_version(session: Session) -> int:
+    '''
+    Returns the latest data version, or 0 if no refresh has been recorded yet
+    '''
+    return session.exec(select(func.coalesce(func.max(DataVersion.version), 0))).one()
+
+def collect_changes(session: Session, since: int, until: int | None = None) -> OutageChanges | None:
+    '''
+    since: the last data version seen by the client
+    until (optional): the last version to include. Defaults to the latest one
+    Merges every version recorded after `since` into a single delta
+    Returns None if nothing has changed. Raises VersionExpired if `since` is older than the versions that are kept
+    '''
+    if since < current_version(session) - KEPT_VERSIONS:
+        raise VersionExpired(f'Version {since} is no longer kept.')
+    statement = select(DataVersion).where(DataVersion.version > since)
+    if until is not None:
+        statement = statement.where(DataVersion.version <= until)
+    versions = session.exec(statement.order_by(DataVersion.version)).all()
+    if not versions:
+        return None
+    
+    # later versions override earlier ones. an event that was added and then removed never reached the client
+    events, removed = {}, {}
+    for version in versions:
+        for event in version.added:
+            key = event_key(event)
+            events[key] = ('modified' if removed.pop(key, None) else 'added', event)
+        for event in version.modified:
+            key = event_key(event)
+            events[key] = (events.get(key, ('modified',))[0], event)
+        for event in version.removed:
+            key = event_key(event)
+            change = events.pop(key, None)
+            if not change or change[0] != 'added':
+                removed[key] = event
+    
+    return OutageChanges(
+        version = versions[-1].version,
+        added = [event for change, event in events.values() if change == 'added'],
+        modified = [event for change, event in events.values() if change == 'modified'],
+        removed = list(removed.values())
+    )
+
+def prune_versions(session: Session, latest: int) -> None:
+    '''
+    latest: the newest data version
+    Deletes the versions that are no longer served by collect_changes(), since every one of them stores full events
+    '''
+    session.exec(delete(DataVersion).where(DataVersion.version <= latest - KEPT_VERSIONS))
 
-        
 def create_models(outages) -> None:
     '''
-    outages: list of outages for the corresponding company
-    creates table objects and adds them to the database
+    outages: list of OutageRecord objects for the corresponding company
+    bulk inserts the records into the database, and records the changes as a new data version
     '''
     
     with Session(engine) as session:
         
+        # refreshes run concurrently, so we take a transaction-level lock to keep versions in commit order
+        session.exec(select(func.pg_advisory_xact_lock(REFRESH_LOCK_ID)))
+        
         # we delete the data from the current week to update it with fresh, updated data
         
         # first ensure that we have updated data for the company before deleting it
         
-        companies_to_delete = [company for company in ('Edeeste', 'Edesur', 'Edenorte') if any(company in outage.values() for outage in outages)]
+        companies_to_delete = list({outage.company for outage in outages})
+        week_number = date.today().isocalendar()[1]
+        
         try:
+            previous = session.exec(select(MaintenanceEvent). \
+                where(MaintenanceEvent.week_number == week_number,
+                MaintenanceEvent.company.in_(companies_to_delete)). \
+                    order_by(MaintenanceEvent.id). \
+                        options(selectinload(MaintenanceEvent.maintenance))).all()
+            previous = _group_events(OutageRecord.from_model(outage) for outage in previous)
             session.exec(delete(MaintenanceEvent). \
-                where(MaintenanceEvent.week_number == date.today().isocalendar()[1],
+                where(MaintenanceEvent.week_number == week_number,
                 MaintenanceEvent.company.in_(companies_to_delete)))
         except ProgrammingError:
             print('Skipping deletion. Table does not exist.')
-    
-        for outage in outages:
-            outage_obj = MaintenanceEvent(week_number = outage['week_number'], company = outage['company'], day = outage['day'], province = outage['province'])
-            for maintenance in outage['maintenance']:
-                maintenance['sectors'] = list(map(lambda x: x.strip(), maintenance['sectors']))
-                maintenance_obj = TimeSectors(time = maintenance['time'], sectors = maintenance['sectors'])
-
-                outage_obj.maintenance.append(maintenance_obj)
-            
-            session.add(outage_obj)
+            session.rollback()
+            session.exec(select(func.pg_advisory_xact_lock(REFRESH_LOCK_ID)))
+            previous = {}
+        
+        if outages:
+            # the returned ids follow the order of the rows, so each record can be matched with its id
+            event_ids = session.execute(insert(MaintenanceEvent). \
+                returning(MaintenanceEvent.id, sort_by_parameter_order = True),
+                [outage.event_row() for outage in outages]).scalars().all()
+            time_sectors = [row for event_id, outage in zip(event_ids, outages) for row in outage.time_sector_rows(event_id)]
+            if time_sectors:
+                session.execute(insert(TimeSectors), time_sectors)
+        
+        changes = diff_events(previous, _group_events(outages))
+        if any(changes.values()):
+            data_version = DataVersion(**changes)
+            session.add(data_version)
+            session.flush()
+            prune_versions(session, data_version.version)
+            # listeners are notified when the transaction commits
+            session.exec(select(func.pg_notify(CHANNEL, str(data_version.version))))
             
         session.commit()
\ No newline at end of file
@@ -24,23 +24,42 @@ function App() {
   const [provinces, setProvinces] = useState<Record<string, string[]>>({});
   const [formData, setFormData] = useState({company: '', province: '', sector: '', date: ''})
   const [isLoading, setIsLoading] = useState<boolean>(false);
+  const [isStale, setIsStale] = useState<boolean>(false);
 
   useEffect(() => {
     setIsLoading(true);
     
+    let events: EventSource | undefined;
+    // the cleanup may run before the first fetch resolves, e.g. under StrictMode
+    let cancelled = false;
+
     const fetchData = async () => {
       try {
         const resp = await fetch('/outages/');
         const data = await resp.json();
         setOutages(data);
         setSearchResult(data)
+        // the current week has not been published yet, so the server sent the previous one
+        setIsStale(resp.headers.get('X-Data-Stale') === 'true')
+        return resp.headers.get('X-Data-Version')
       } catch (error) {
         console.error(`Error fetching data. ${error}`);
       } finally {
         setIsLoading(false);
       }
     }
-    fetchData();
+
+    fetchData().then(version => {
+      if (cancelled) return;
+      // the server pushes a notification whenever a refresh lands new data
+      events = new EventSource(`/outages/stream${version ? `?since=${version}` : ''}`);
+      events.addEventListener('version', () => { fetchData() });
+    });
+
+    return () => {
+      cancelled = true;
+      events?.close();
+    };
   }, [])
 
   useEffect(() => {
@@ -135,6 +154,11 @@ function App() {
       </header>
 
       <main className='min-h-screen flex flex-col items-center bg-[#f9fafb]'>
+        {isStale && (
+          <p className='w-full text-center bg-[#fff8e1] text-[#8a6d3b] border border-[#ffe08a] rounded-2xl p-4'>
+            La programación de esta semana aún no ha sido publicada. Mostrando la de la semana anterior.
+          </p>
+        )}
         <section className='bg-white border border-[#dee2e6] rounded-2xl p-10 mt-10 shadow-xl w-full'>
           <form method='get'>
             <div className='grid grid-cols-1 sm:grid-cols-2 md:grid-cols-4 gap-y-6 gap-x-4 items-end'>